@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Equipment, EquipmentCategory, EquipmentPhoto, Location
+from .search import search_equipment
 
 
 @admin.register(EquipmentCategory)
@@ -17,6 +18,7 @@ class LocationAdmin(admin.ModelAdmin):
 class EquipmentPhotoInline(admin.TabularInline):
     model = EquipmentPhoto
     extra = 1
+    readonly_fields = ('variants_status',)
 
 
 @admin.register(Equipment)
@@ -25,3 +27,8 @@ class EquipmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'category')
     search_fields = ('name', 'id')
     inlines = [EquipmentPhotoInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_equipment(queryset, search_term), False
@@ -0,0 +1,239 @@
+"""Streaming bulk import of equipment from CSV or XLSX files.
+
+Rows are read one at a time, categories and locations are resolved through in-memory maps and
+equipment is written with ``bulk_create`` in batches, each batch in its own transaction. Rows that
+cannot be imported are written to an error report instead of aborting the whole file.
+"""
+import csv
+import io
+import itertools
+import time
+import uuid
+from pathlib import Path
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .models import Equipment, EquipmentCategory, Location
+from .signals import equipment_changed
+
+HEADER_ALIASES = {
+    'id': 'id',
+    'name': 'name',
+    'наименование': 'name',
+    'наименование оборудования': 'name',
+    'category': 'category',
+    'категория': 'category',
+    'location': 'location',
+    'местоположение': 'location',
+    'description': 'description',
+    'описание': 'description',
+    'status': 'status',
+    'статус': 'status',
+}
+# Nested locations are written as a path from the root, e.g. "Главный склад / Цех A".
+LOCATION_SEPARATOR = '/'
+COLUMNS = ('id', 'name', 'description', 'status', 'category_id', 'location_id', 'created_at', 'updated_at')
+# File columns an import may overwrite on existing items. Status is deliberately absent: it only
+# applies to new items, as an issued item must go through return to change state.
+UPDATABLE_COLUMNS = {
+    'name': 'name',
+    'description': 'description',
+    'category': 'category_id',
+    'location': 'location_id',
+}
+STAGING_TABLE = 'equipment_import_rows'
+
+_STATUSES = {}
+for _value, _label in Equipment.Status.choices:
+    _STATUSES[_value] = _value
+    _STATUSES[str(_label).casefold()] = _value
+
+
+class RowError(Exception):
+    pass
+
+
+def _normalize_header(header):
+    return HEADER_ALIASES.get(str(header or '').strip().casefold())
+
+
+def _cell(value):
+    return '' if value is None else str(value).strip()
+
+
+def read_rows(file, filename: str):
+    """Yield ``(row number, {column: value})`` from a CSV or XLSX file without loading it whole.
+
+    Every row carries all of the header's known columns, blank where the row is short.
+    """
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.xlsx':
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_normalize_header(value) for value in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                yield number, {key: _cell(value) for key, value in itertools.zip_longest(header, values) if key}
+        finally:
+            workbook.close()
+    elif suffix == '.csv':
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        first_line = text.readline()
+        # Spreadsheet exports use ',' or ';' depending on locale; the header line tells which.
+        delimiter = max(',;\t', key=first_line.count)
+        reader = csv.reader(itertools.chain([first_line], text), delimiter=delimiter)
+        header = [_normalize_header(value) for value in next(reader, [])]
+        for number, values in enumerate(reader, start=2):
+            yield number, {key: _cell(value) for key, value in itertools.zip_longest(header, values) if key}
+        text.detach()
+    else:
+        raise ValueError('Unsupported file type: use .csv or .xlsx')
+
+
+class EquipmentImporter:
+    """Import equipment rows, creating missing categories and locations by name.
+
+    Rows with an ``id`` that already exists update that item, so re-importing a corrected file is
+    safe. Only the columns present in the file are updated, and never the status. Failed rows go to
+    ``report``, a CSV writer, with their row number and error.
+    """
+
+    def __init__(self, batch_size: int = 2000, report=None):
+        self.batch_size = batch_size
+        self.report = report
+        self.categories = dict(EquipmentCategory.objects.values_list('name', 'id'))
+        self.locations = {
+            (parent_id, name): pk for pk, name, parent_id in Location.objects.values_list('id', 'name', 'parent_id')
+        }
+        self.seen_ids = set()
+        self.update_columns = None
+        self.now = timezone.now()
+        self.stats = {'rows': 0, 'imported': 0, 'failed': 0, 'seconds': 0.0}
+
+    def run(self, rows):
+        started = time.perf_counter()
+        if self.report is not None:
+            self.report.writerow(['row', 'error', 'name', 'category', 'location', 'status'])
+        batch = []
+        for number, row in rows:
+            self.stats['rows'] += 1
+            if self.update_columns is None:
+                self.update_columns = [column for key, column in UPDATABLE_COLUMNS.items() if key in row]
+                self.update_columns.append('updated_at')
+            try:
+                batch.append((number, row, self.build(row)))
+            except RowError as exc:
+                self.fail(number, row, str(exc))
+                continue
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        self.stats['seconds'] = round(time.perf_counter() - started, 3)
+        return self.stats
+
+    def fail(self, number, row, message):
+        self.stats['failed'] += 1
+        if self.report is not None:
+            self.report.writerow([
+                number, message, row.get('name', ''), row.get('category', ''),
+                row.get('location', ''), row.get('status', ''),
+            ])
+
+    def build(self, row) -> tuple:
+        """Validate a row and return its values in ``COLUMNS`` order."""
+        name = row.get('name', '')
+        if not name:
+            raise RowError('Name is required')
+        if len(name) > Equipment._meta.get_field('name').max_length:
+            raise RowError('Name is too long')
+        equipment_id = uuid.uuid4()
+        if row.get('id'):
+            try:
+                equipment_id = uuid.UUID(row['id'])
+            except ValueError:
+                raise RowError(f'Invalid id: {row["id"]}') from None
+            if equipment_id in self.seen_ids:
+                raise RowError(f'Duplicate id in file: {equipment_id}')
+        status = Equipment.Status.IN_STOCK
+        if row.get('status'):
+            status = _STATUSES.get(row['status'].casefold())
+            if status is None:
+                raise RowError(f'Unknown status: {row["status"]}')
+        # Resolved last, so a row rejected above never creates a category or location.
+        category_id = self.category_id(row.get('category', ''))
+        location_id = self.location_id(row.get('location', ''))
+        if row.get('id'):
+            self.seen_ids.add(equipment_id)
+        return (
+            equipment_id, name, row.get('description', ''), status, category_id, location_id, self.now, self.now,
+        )
+
+    def category_id(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            if len(name) > EquipmentCategory._meta.get_field('name').max_length:
+                raise RowError('Category name is too long')
+            self.categories[name] = EquipmentCategory.objects.get_or_create(name=name)[0].id
+        return self.categories[name]
+
+    def location_id(self, value):
+        parent_id = None
+        for name in filter(None, (part.strip() for part in value.split(LOCATION_SEPARATOR))):
+            key = (parent_id, name)
+            if key not in self.locations:
+                if len(name) > Location._meta.get_field('name').max_length:
+                    raise RowError('Location name is too long')
+                # Saved one by one so the materialized path is maintained.
+                location = Location(name=name, parent_id=parent_id)
+                location.save()
+                self.locations[key] = location.id
+            parent_id = self.locations[key]
+        return parent_id
+
+    def _insert(self, values):
+        """Upsert rows through a COPY-filled staging table: far cheaper per row than a VALUES list."""
+        columns = ', '.join(COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} AS '
+                f'SELECT {columns} FROM {Equipment._meta.db_table} WITH NO DATA'
+            )
+            with cursor.copy(f'COPY {STAGING_TABLE} ({columns}) FROM STDIN') as copy:
+                for row in values:
+                    copy.write_row(row)
+            cursor.execute(
+                f'INSERT INTO {Equipment._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM {STAGING_TABLE} '
+                f'ON CONFLICT (id) DO UPDATE SET '
+                + ', '.join(f'{column} = EXCLUDED.{column}' for column in self.update_columns)
+            )
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+
+    def flush(self, batch):
+        try:
+            with transaction.atomic():
+                self._insert([values for _, _, values in batch])
+                imported = [values[0] for _, _, values in batch]
+        except DatabaseError:
+            # Isolate the offending rows so the rest of the batch still lands.
+            imported = []
+            for number, row, values in batch:
+                try:
+                    with transaction.atomic():
+                        self._insert([values])
+                except DatabaseError as exc:
+                    self.fail(number, row, str(exc).strip())
+                else:
+                    imported.append(values[0])
+        self.stats['imported'] += len(imported)
+        if imported:
+            equipment_changed.send(sender=Equipment, ids=imported)
+
+
+def import_equipment(file, filename: str, report=None, batch_size: int = 2000):
+    return EquipmentImporter(batch_size=batch_size, report=report).run(read_rows(file, filename))
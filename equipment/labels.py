@@ -0,0 +1,224 @@
+"""Label-sheet rendering for bulk QR printing.
+
+Pages are rendered independently, optionally in a process pool, and fed to a streaming PDF
+writer in order. This module does not touch the ORM or settings at import time, so pool
+workers can import it without setting up Django.
+"""
+import collections
+import multiprocessing
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .pdf import StreamingPdfWriter
+from .qr import dark_runs, qr_matrix
+
+A4_POINTS = (595.28, 841.89)
+MM = 72 / 25.4
+
+
+class SheetLayout:
+    """Geometry of an A4 page split into a ``cols`` x ``rows`` grid of labels."""
+
+    def __init__(self, cols=1, rows=1, captions=False, dpi=150, margin_mm=8, font_path=None):
+        self.cols = cols
+        self.rows = rows
+        self.captions = captions
+        self.dpi = dpi
+        self.font_path = font_path
+        self.width, self.height = A4_POINTS
+        self.margin = margin_mm * MM
+        self.cell_width = (self.width - 2 * self.margin) / cols
+        self.cell_height = (self.height - 2 * self.margin) / rows
+        self.caption_height = self.cell_height * 0.18 if captions else 0
+        self.code_size = min(self.cell_width, self.cell_height - self.caption_height) * 0.9
+
+    @property
+    def per_page(self) -> int:
+        return self.cols * self.rows
+
+    def cells(self):
+        """Top-left corners of the cells in reading order, in points from the top of the page."""
+        for row in range(self.rows):
+            for col in range(self.cols):
+                yield self.margin + col * self.cell_width, self.margin + row * self.cell_height
+
+
+def _load_font(path, size):
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size=size)
+
+
+def _fit_caption(draw, text, font, max_width):
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + '…', font=font) > max_width:
+        text = text[:-1]
+    return text + '…'
+
+
+def render_raster_page(layout: SheetLayout, items):
+    """Render one page of ``(payload, caption)`` items as a single grayscale bitmap.
+
+    Returns the page content stream, images and masks, ready for ``StreamingPdfWriter.add_page``.
+    """
+    scale = layout.dpi / 72
+    width, height = round(layout.width * scale), round(layout.height * scale)
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = None
+    if layout.captions:
+        font = _load_font(layout.font_path, max(8, round(layout.caption_height * scale * 0.45)))
+    for (left, top), (payload, caption) in zip(layout.cells(), items):
+        matrix = qr_matrix(payload, border=2)
+        modules = len(matrix)
+        code = Image.frombytes('L', (modules, modules), bytes(0 if dark else 255 for row in matrix for dark in row))
+        module_px = max(1, int(layout.code_size * scale) // modules)
+        code = code.resize((modules * module_px, modules * module_px), Image.NEAREST)
+        cell_left, cell_top = left * scale, top * scale
+        cell_width = layout.cell_width * scale
+        code_top = cell_top + (layout.cell_height - layout.caption_height) * scale / 2 - code.height / 2
+        page.paste(code, (round(cell_left + cell_width / 2 - code.width / 2), round(code_top)))
+        if font is not None and caption:
+            text = _fit_caption(draw, caption, font, cell_width * 0.95)
+            text_top = code_top + code.height
+            draw.text((cell_left + cell_width / 2, text_top), text, font=font, fill=0, anchor='ma')
+    content = b'q %.2f 0 0 %.2f 0 0 cm /Page Do Q' % (layout.width, layout.height)
+    return content, [('Page', width, height, zlib.compress(page.tobytes(), 6))], []
+
+
+def _render_caption(layout: SheetLayout, caption: str, font):
+    """Rasterize a caption as a 1-bit stencil at twice the page resolution to keep glyphs crisp."""
+    scale = layout.dpi * 2 / 72
+    width, height = round(layout.cell_width * scale), round(layout.caption_height * scale)
+    image = Image.new('1', (width, height), 1)
+    draw = ImageDraw.Draw(image)
+    text = _fit_caption(draw, caption, font, width * 0.95)
+    draw.text((width / 2, 0), text, font=font, fill=0, anchor='ma')
+    return width, height, zlib.compress(image.tobytes(), 9)
+
+
+def render_vector_page(layout: SheetLayout, items):
+    """Render one page with QR modules drawn as filled PDF rectangles instead of bitmaps.
+
+    Captions are small 1-bit stencil masks: the base PDF fonts have no Cyrillic glyphs and
+    embedding a TrueType font would cost more than the masks themselves.
+    """
+    commands = [b'0 g']
+    masks = []
+    font = None
+    if layout.captions:
+        font = _load_font(layout.font_path, max(8, round(layout.caption_height * layout.dpi * 2 / 72 * 0.45)))
+    for index, ((left, top), (payload, caption)) in enumerate(zip(layout.cells(), items)):
+        matrix = qr_matrix(payload, border=2)
+        module = layout.code_size / len(matrix)
+        code_left = left + (layout.cell_width - layout.code_size) / 2
+        code_top = top + (layout.cell_height - layout.caption_height - layout.code_size) / 2
+        # Flip the y axis so module rows run downwards from the code's top-left corner.
+        commands.append(b'q %.4f 0 0 %.4f %.2f %.2f cm' % (
+            module, -module, code_left, layout.height - code_top,
+        ))
+        commands.extend(b'%d %d %d 1 re' % run for run in dark_runs(matrix))
+        commands.append(b'f Q')
+        if font is not None and caption:
+            name = f'C{index}'
+            masks.append((name, *_render_caption(layout, caption, font)))
+            caption_bottom = layout.height - (code_top + layout.code_size + layout.caption_height)
+            commands.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q' % (
+                layout.cell_width, layout.caption_height, left, caption_bottom, name.encode('ascii'),
+            ))
+    return b'\n'.join(commands), [], masks
+
+
+# One pool is shared by every streaming response in the process; the lock guards its replacement.
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                # Pages already submitted to the old pool still finish.
+                _executor.shutdown(wait=False)
+            # spawn keeps workers free of the parent's threads, locks and database connections.
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Drop ``executor`` after it broke, unless another stream has already replaced it."""
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _render_pages(render, layout, items, workers):
+    pages = _chunked(items, layout.per_page)
+    if workers <= 1:
+        for page_items in pages:
+            yield render(layout, page_items)
+        return
+    # At most two pages per worker are in flight, which bounds memory for any document size.
+    # Each entry is ``[page_items, future]``; the future is None until submitted.
+    pending = collections.deque()
+    retried = False
+    while True:
+        executor = _get_executor(workers)
+        try:
+            for entry in pending:
+                if entry[1] is None:
+                    entry[1] = executor.submit(render, layout, entry[0])
+            for page_items in pages:
+                pending.append([page_items, None])
+                pending[-1][1] = executor.submit(render, layout, page_items)
+                if len(pending) >= workers * 2:
+                    yield pending[0][1].result()
+                    pending.popleft()
+            while pending:
+                yield pending[0][1].result()
+                pending.popleft()
+            return
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory) and took the shared pool with it. A fresh pool
+            # gets the pages in flight once; failing again points at the pages themselves.
+            if retried:
+                raise
+            retried = True
+            _discard_executor(executor)
+            for entry in pending:
+                entry[1] = None
+
+
+def stream_label_pdf(items, layout: SheetLayout, vector: bool = False, workers: int = 1):
+    """Yield a PDF of ``(payload, caption)`` items page by page."""
+    render = render_vector_page if vector else render_raster_page
+    writer = StreamingPdfWriter()
+    yield writer.start()
+    for content, images, masks in _render_pages(render, layout, items, workers):
+        yield writer.add_page(layout.width, layout.height, content, images, masks)
+    yield writer.finish()
@@ -0,0 +1,42 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from equipment import labels, qr
+
+
+class Command(BaseCommand):
+    help = 'Compare raster and vector QR output: single codes (PNG vs SVG) and label-sheet PDFs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', nargs='+', type=int, default=[1000, 10000])
+        parser.add_argument('--cols', type=int, default=3)
+        parser.add_argument('--rows', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=settings.QR_RENDER_WORKERS)
+
+    def handle(self, *args, **options):
+        layout = labels.SheetLayout(
+            cols=options['cols'],
+            rows=options['rows'],
+            captions=True,
+            font_path=settings.QR_LABEL_FONT,
+        )
+        self.stdout.write(f'{"items":>7} {"output":<12} {"seconds":>9} {"items/s":>9} {"bytes":>12}')
+        for count in options['counts']:
+            payloads = [str(uuid.uuid4()) for _ in range(count)]
+            for image_format in ('png', 'svg'):
+                render, _ = qr.RENDERERS[image_format]
+                started = time.perf_counter()
+                size = sum(len(render(payload)) for payload in payloads)
+                self._report(count, image_format, time.perf_counter() - started, size)
+            items = [(payload, f'Оборудование {index}') for index, payload in enumerate(payloads)]
+            for name, vector in (('pdf-raster', False), ('pdf-vector', True)):
+                started = time.perf_counter()
+                stream = labels.stream_label_pdf(iter(items), layout, vector=vector, workers=options['workers'])
+                size = sum(len(chunk) for chunk in stream)
+                self._report(count, name, time.perf_counter() - started, size)
+
+    def _report(self, count, name, seconds, size):
+        self.stdout.write(f'{count:>7} {name:<12} {seconds:>9.2f} {count / seconds:>9.0f} {size:>12}')
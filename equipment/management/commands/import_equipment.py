@@ -0,0 +1,30 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipment.importing import import_equipment
+
+
+class Command(BaseCommand):
+    help = 'Import equipment from a CSV or XLSX file, creating missing categories and locations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--report', help='Where to write rejected rows (default: <path>.errors.csv).')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        report_path = options['report'] or f'{path}.errors.csv'
+        try:
+            with open(path, 'rb') as source, open(report_path, 'w', newline='', encoding='utf-8-sig') as report:
+                stats = import_equipment(source, path, csv.writer(report), options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(
+            f'{stats["imported"]} imported, {stats["failed"]} failed of {stats["rows"]} rows '
+            f'in {stats["seconds"]:.1f}s ({rate:.0f} rows/s)'
+        )
+        if stats['failed']:
+            self.stdout.write(f'Rejected rows: {report_path}')
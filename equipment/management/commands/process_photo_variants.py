@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from equipment.photos import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Build resized JPEG/WebP variants for uploaded equipment photos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+        parser.add_argument('--batch', type=int, default=50, help='Photos handled between idle checks.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when idle.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending(limit=options['batch'])
+            if processed:
+                self.stdout.write(f'Processed {processed} photo(s)')
+            if options['once'] and processed < options['batch']:
+                return
+            if processed < options['batch']:
+                time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Location = apps.get_model('equipment', 'Location')
+    parents = dict(Location.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(location_id, seen=()):
+        if location_id not in paths:
+            parent_id = parents[location_id]
+            if parent_id is None or parent_id in seen:
+                paths[location_id] = f'/{location_id}/'
+            else:
+                paths[location_id] = f'{path_for(parent_id, seen + (location_id,))}{location_id}/'
+        return paths[location_id]
+
+    for location_id in parents:
+        Location.objects.filter(pk=location_id).update(path=path_for(location_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0004_equipment_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['path'], name='location_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
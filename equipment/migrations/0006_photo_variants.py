@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0005_location_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentphoto',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='equipmentphoto',
+            name='variants_status',
+            field=models.CharField(choices=[('pending', 'Ожидает обработки'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='pending', editable=False, max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentphoto',
+            index=models.Index(condition=models.Q(('variants_status', 'pending')), fields=['id'], name='equipmentphoto_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_open_issues(apps, schema_editor):
+    Equipment = apps.get_model('equipment', 'Equipment')
+    Operation = apps.get_model('operations', 'Operation')
+    latest_issue = Operation.objects.filter(
+        equipment=OuterRef('pk'), action_type='issue',
+    ).order_by('-timestamp', '-id')
+    Equipment.objects.filter(status='issued').update(
+        current_issue=Subquery(latest_issue.values('id')[:1]),
+        current_due_at=Subquery(latest_issue.values('due_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_catalogversion'),
+        ('operations', '0003_operation_operation_timestamp_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipment',
+            name='current_due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='current_issue',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='operations.operation'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(condition=models.Q(('current_due_at__isnull', False)), fields=['current_due_at'], name='equipment_open_due_idx'),
+        ),
+        migrations.RunPython(link_open_issues, migrations.RunPython.noop),
+    ]
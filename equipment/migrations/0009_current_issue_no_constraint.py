@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0008_current_issue'),
+        ('operations', '0004_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipment',
+            name='current_issue',
+            field=models.ForeignKey(blank=True, db_constraint=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='operations.operation'),
+        ),
+    ]
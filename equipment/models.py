@@ -1,7 +1,15 @@
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+SEARCH_CONFIG = 'russian'
 
 
 class EquipmentCategory(models.Model):
@@ -16,13 +24,47 @@ class Location(models.Model):
     name = models.CharField(max_length=120)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children')
     description = models.TextField(blank=True)
+    # Materialized path of ancestor ids, e.g. '/1/4/9/': a subtree is one indexed prefix scan.
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)
 
     class Meta:
         unique_together = ('name', 'parent')
+        indexes = [
+            models.Index(fields=['path'], name='location_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    def is_ancestor_of(self, other) -> bool:
+        return bool(self.pk) and f'/{self.pk}/' in other.path
+
+    def clean(self):
+        if self.parent is not None and self.is_ancestor_of(self.parent):
+            raise ValidationError({'parent': 'A location cannot be nested inside itself.'})
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+
+    def _update_path(self):
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Location.objects.values_list('path', flat=True).get(pk=self.parent_id)
+        new_path = f'{parent_path}{self.pk}/'
+        old_path = Location.objects.values_list('path', flat=True).get(pk=self.pk)
+        if new_path != old_path:
+            if old_path and parent_path.startswith(old_path):
+                raise ValueError('A location cannot be moved into its own subtree.')
+            # Re-root the whole subtree, this node included, in a single UPDATE.
+            subtree = Location.objects.filter(path__startswith=old_path) if old_path else Location.objects.filter(pk=self.pk)
+            subtree.update(path=Concat(Value(new_path), Substr('path', len(old_path) + 1)))
+        self.path = new_path
+
+    def subtree(self):
+        return Location.objects.filter(path__startswith=self.path)
+
 
 class Equipment(models.Model):
     class Status(models.TextChoices):
@@ -46,6 +88,40 @@ class Equipment(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # The open issue operation and its due date, kept by the issue/return transitions so overdue
+    # checks read only items on loan instead of the whole operations ledger.
+    current_issue = models.ForeignKey(
+        'operations.Operation',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        # operations_operation is partitioned by timestamp, so its id alone cannot back a foreign key.
+        db_constraint=False,
+    )
+    current_due_at = models.DateTimeField(null=True, blank=True, editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='equipment_updated_id_idx'),
+            models.Index(
+                fields=['current_due_at'],
+                condition=models.Q(current_due_at__isnull=False),
+                name='equipment_open_due_idx',
+            ),
+            GinIndex(fields=['search_vector'], name='equipment_search_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='equipment_name_trgm_idx'),
+            GinIndex(fields=['description'], opclasses=['gin_trgm_ops'], name='equipment_description_trgm_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name} ({self.id})'
@@ -56,9 +132,58 @@ class Equipment(models.Model):
 
 
 class EquipmentPhoto(models.Model):
+    class VariantsStatus(models.TextChoices):
+        PENDING = 'pending', 'Ожидает обработки'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
     equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='photos')
     image = models.ImageField(upload_to='equipment_photos/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # {"<width>": {"jpeg": "<storage name>", "webp": "<storage name>"}}, filled by process_photo_variants.
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    variants_status = models.CharField(
+        max_length=16, choices=VariantsStatus.choices, default=VariantsStatus.PENDING, editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(variants_status='pending'),
+                name='equipmentphoto_pending_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'Photo for {self.equipment_id}'
+
+    def save(self, *args, **kwargs):
+        if not self.image._committed:
+            # A newly assigned file needs fresh variants; the worker replaces the old ones.
+            self.variants_status = self.VariantsStatus.PENDING
+        super().save(*args, **kwargs)
+
+
+class CatalogVersion(models.Model):
+    """Write counter per catalogue collection, used as a cheap validator for conditional GETs."""
+
+    name = models.CharField(max_length=32, primary_key=True)
+    version = models.BigIntegerField(default=1)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f'{self.name} v{self.version}'
+
+    @classmethod
+    def bump(cls, name: str) -> None:
+        if not cls.objects.filter(name=name).update(version=F('version') + 1, changed_at=timezone.now()):
+            cls.objects.get_or_create(name=name)
+
+    @classmethod
+    def current(cls, name: str) -> 'CatalogVersion':
+        try:
+            return cls.objects.get(name=name)
+        except cls.DoesNotExist:
+            # Never written since the table was created; the first bump stores version 1.
+            return cls(name=name, version=0)
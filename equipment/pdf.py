@@ -0,0 +1,80 @@
+import zlib
+
+
+class StreamingPdfWriter:
+    """Minimal PDF writer that returns each page's bytes as soon as the page is added.
+
+    The catalog (object 1) and the page tree (object 2) are written at the end, once the page
+    list is known, so only object offsets are kept in memory however long the document gets.
+    """
+
+    def __init__(self):
+        self._position = 0
+        self._offsets = {}
+        self._next_number = 3
+        self._pages = []
+
+    def _reserve(self) -> int:
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self._position += len(chunk)
+        return chunk
+
+    def _object(self, number: int, body: bytes) -> bytes:
+        self._offsets[number] = self._position
+        return self._emit(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def _stream(self, number: int, dictionary: bytes, data: bytes) -> bytes:
+        body = b'<< %s /Length %d >>\nstream\n%s\nendstream' % (dictionary, len(data), data)
+        return self._object(number, body)
+
+    def start(self) -> bytes:
+        return self._emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def add_page(self, width: float, height: float, content: bytes, images=(), masks=()) -> bytes:
+        """Write one page.
+
+        ``images`` are ``(name, width, height, flate_data)`` 8-bit grayscale XObjects; ``masks`` are
+        1-bit stencil masks of the same shape, which paint only their 0 bits in the current colour.
+        """
+        chunks = []
+        xobjects = []
+        kinds = (
+            (images, b'/ColorSpace /DeviceGray /BitsPerComponent 8'),
+            (masks, b'/ImageMask true /BitsPerComponent 1'),
+        )
+        for entries, sampling in kinds:
+            for name, image_width, image_height, data in entries:
+                number = self._reserve()
+                dictionary = b'/Type /XObject /Subtype /Image /Width %d /Height %d %s /Filter /FlateDecode' % (
+                    image_width, image_height, sampling,
+                )
+                chunks.append(self._stream(number, dictionary, data))
+                xobjects.append(b'/%s %d 0 R' % (name.encode('ascii'), number))
+        content_number = self._reserve()
+        chunks.append(self._stream(content_number, b'/Filter /FlateDecode', zlib.compress(content)))
+        resources = b'<< /XObject << %s >> >>' % b' '.join(xobjects) if xobjects else b'<< >>'
+        page_number = self._reserve()
+        chunks.append(self._object(
+            page_number,
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R >>'
+            % (width, height, resources, content_number),
+        ))
+        self._pages.append(page_number)
+        return b''.join(chunks)
+
+    def finish(self) -> bytes:
+        kids = b' '.join(b'%d 0 R' % number for number in self._pages)
+        chunks = [
+            self._object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._pages))),
+            self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>'),
+        ]
+        xref_position = self._position
+        size = self._next_number
+        chunks.append(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        chunks.extend(b'%010d 00000 n \n' % self._offsets[number] for number in range(1, size))
+        chunks.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_position))
+        return self._emit(b''.join(chunks))
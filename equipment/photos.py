@@ -0,0 +1,96 @@
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import EquipmentPhoto
+
+logger = logging.getLogger(__name__)
+
+# (format key, Pillow format, file extension, save options)
+VARIANT_FORMATS = (
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Drop alpha onto a white background; JPEG has no transparency."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(source: Image.Image, widths):
+    """Yield ``(width, format key, extension, bytes)`` for each variant of ``source``.
+
+    The image is rotated upright from its EXIF orientation and re-encoded without metadata, so
+    GPS coordinates and camera details in the original never reach the variants. Widths larger
+    than the original are skipped, except that the original size is used when all of them are.
+    """
+    image = _flatten(ImageOps.exif_transpose(source))
+    targets = sorted({width for width in widths if width < image.width}) or [image.width]
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for key, pillow_format, extension, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=pillow_format, **options)
+            yield width, key, extension, buffer.getvalue()
+
+
+def _delete_variants(storage, variants):
+    for formats in variants.values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def generate_variants(photo: EquipmentPhoto) -> None:
+    storage = photo.image.storage
+    old_variants = photo.variants
+    variants = {}
+    try:
+        with photo.image.open('rb') as image_file, Image.open(image_file) as source:
+            for width, key, extension, data in render_variants(source, settings.PHOTO_VARIANT_WIDTHS):
+                name = storage.save(
+                    f'equipment_photos/variants/{photo.pk}/{width}.{extension}', ContentFile(data),
+                )
+                variants.setdefault(str(width), {})[key] = name
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('Could not build variants for photo %s', photo.pk)
+        _delete_variants(storage, variants)
+        photo.variants_status = EquipmentPhoto.VariantsStatus.FAILED
+        photo.save(update_fields=['variants_status'])
+        return
+    _delete_variants(storage, old_variants)
+    photo.variants = variants
+    photo.variants_status = EquipmentPhoto.VariantsStatus.READY
+    photo.save(update_fields=['variants', 'variants_status'])
+
+
+def process_pending(limit=None) -> int:
+    """Build variants for pending photos, one row-locked photo per transaction.
+
+    ``SKIP LOCKED`` lets several workers drain the queue concurrently without picking the same row.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        with transaction.atomic():
+            photo = (
+                EquipmentPhoto.objects
+                .select_for_update(skip_locked=True)
+                .filter(variants_status=EquipmentPhoto.VariantsStatus.PENDING)
+                .order_by('id')
+                .first()
+            )
+            if photo is None:
+                break
+            generate_variants(photo)
+        processed += 1
+    return processed
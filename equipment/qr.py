@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+
+# Bump whenever rendering changes the produced bytes, so stale cache entries and ETags are dropped.
+RENDER_VERSION = 2
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+# Any mask is valid for scanners; fixing one skips qrcode's penalty search, most of the encode time.
+MATRIX_MASK_PATTERN = 0
+
+
+def render_key(payload: str, image_format: str, box_size: int, border: int) -> str:
+    """Content address of a rendered code: identical inputs always map to identical bytes."""
+    raw = f'{RENDER_VERSION}|{image_format}|{box_size}|{border}|{payload}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def qr_matrix(payload: str, border: int = DEFAULT_BORDER):
+    code = qrcode.QRCode(border=border, mask_pattern=MATRIX_MASK_PATTERN)
+    code.add_data(payload)
+    code.make(fit=True)
+    return code.get_matrix()
+
+
+def dark_runs(matrix):
+    """Yield ``(x, y, length)`` for every horizontal run of dark modules."""
+    for y, row in enumerate(matrix):
+        x = 0
+        width = len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            yield start, y, x - start
+
+
+def render_png(payload: str, box_size: int = DEFAULT_BOX_SIZE, border: int = DEFAULT_BORDER) -> bytes:
+    code = qrcode.QRCode(box_size=box_size, border=border, mask_pattern=MATRIX_MASK_PATTERN)
+    code.add_data(payload)
+    code.make(fit=True)
+    buffer = io.BytesIO()
+    code.make_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(payload: str, box_size: int = DEFAULT_BOX_SIZE, border: int = DEFAULT_BORDER) -> bytes:
+    """Render the code as a single SVG path, one stroked segment per run of dark modules."""
+    matrix = qr_matrix(payload, border)
+    size = len(matrix)
+    path = ''.join(f'M{x} {y}.5h{length}' for x, y, length in dark_runs(matrix))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * box_size}" height="{size * box_size}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{path}" stroke="#000"/></svg>'
+    ).encode('ascii')
+
+
+RENDERERS = {
+    'png': (render_png, 'image/png'),
+    'svg': (render_svg, 'image/svg+xml'),
+}
+
+
+class RenderCache:
+    """Size-bounded on-disk cache of rendered images with least-recently-used eviction.
+
+    Entries are immutable files named by their content key. A hit refreshes the file's mtime,
+    which is the recency order used by eviction. The directory is swept only after roughly a
+    tenth of the budget has been written by this process, so writes stay cheap.
+    """
+
+    def __init__(self, directory, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, extension: str) -> Path:
+        return self.directory / key[:2] / f'{key}.{extension}'
+
+    def get(self, key: str, extension: str):
+        path = self.path_for(key, extension)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, extension: str, data: bytes) -> None:
+        path = self.path_for(key, extension)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._written += len(data)
+            if self._written < self.max_bytes // 10:
+                return
+            self._written = 0
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.directory.glob('*/*'):
+            # Files still being written by ``put`` are neither entries nor safe to remove.
+            if path.suffix == '.tmp':
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 9 // 10
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= target:
+                break
+
+
+_cache = None
+
+
+def get_render_cache() -> RenderCache:
+    global _cache
+    directory = Path(settings.QR_CACHE_DIR)
+    if _cache is None or _cache.directory != directory or _cache.max_bytes != settings.QR_CACHE_MAX_BYTES:
+        _cache = RenderCache(directory, settings.QR_CACHE_MAX_BYTES)
+    return _cache
+
+
+def get_image(payload: str, image_format: str = 'png', box_size: int = DEFAULT_BOX_SIZE,
+              border: int = DEFAULT_BORDER) -> bytes:
+    cache = get_render_cache()
+    key = render_key(payload, image_format, box_size, border)
+    data = cache.get(key, image_format)
+    if data is None:
+        render, _ = RENDERERS[image_format]
+        data = render(payload, box_size, border)
+        cache.put(key, image_format, data)
+    return data
@@ -0,0 +1,172 @@
+"""Two-tier cache of the compact item projection returned to barcode scans.
+
+A small per-process LRU with a short TTL sits in front of the shared Django cache, so repeated
+scans of the same shelf are answered from memory. Writers invalidate both tiers through
+``equipment_changed`` once their transaction commits; other processes' local copies age out
+within ``SCAN_CACHE_LOCAL_TTL`` seconds. Shared entries carry a generation token, so a change too
+large to list (``ids=None``) drops them all by replacing the token.
+
+A lookup that read the database before a change committed must not store what it read after that
+change's invalidation. Per-item invalidation therefore leaves a short-lived mark next to the
+deleted entry, and a lookup re-reads the marks (and the token) after storing its rows and deletes
+any rows that were invalidated while it was loading them.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Equipment
+
+GENERATION_KEY = 'scan:generation'
+# Longer than any lookup takes between its database read and its re-check of the marks.
+INVALIDATION_HOLD = 30
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded mapping whose entries expire ``ttl`` seconds after being stored."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_local = None
+
+
+def _local_cache() -> LocalLRU:
+    global _local
+    size, ttl = settings.SCAN_CACHE_LOCAL_SIZE, settings.SCAN_CACHE_LOCAL_TTL
+    if _local is None or _local.max_entries != size or _local.ttl != ttl:
+        _local = LocalLRU(size, ttl)
+    return _local
+
+
+def _shared():
+    return caches[settings.SCAN_CACHE_ALIAS]
+
+
+def _key(equipment_id: uuid.UUID) -> str:
+    return f'scan:item:{equipment_id.hex}'
+
+
+def _mark(key: str) -> str:
+    return key.replace('scan:item:', 'scan:changed:', 1)
+
+
+def _projection(equipment_id, name, item_status, location_id) -> dict:
+    return {'id': str(equipment_id), 'name': name, 'status': item_status, 'location': location_id}
+
+
+def lookup_many(equipment_ids) -> dict:
+    """Map each of ``equipment_ids`` (UUIDs) that exists to its projection; misses share one ``id__in`` query."""
+    local = _local_cache()
+    keys = {_key(equipment_id): equipment_id for equipment_id in equipment_ids}
+    found = {}
+    missing = []
+    for key, equipment_id in keys.items():
+        projection = local.get(key)
+        if projection is None:
+            missing.append(key)
+        else:
+            found[equipment_id] = projection
+    if not missing:
+        return found
+
+    shared = _shared()
+    entries = shared.get_many([GENERATION_KEY, *missing])
+    generation = entries.get(GENERATION_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not shared.add(GENERATION_KEY, generation, timeout=None):
+            generation = shared.get(GENERATION_KEY, generation)
+    to_load = {}
+    for key in missing:
+        entry = entries.get(key)
+        if entry is not None and entry[0] == generation:
+            found[keys[key]] = entry[1]
+            local.set(key, entry[1])
+        else:
+            to_load[keys[key]] = key
+    if to_load:
+        loaded = {}
+        rows = Equipment.objects.filter(id__in=list(to_load)).values_list('id', 'name', 'status', 'location_id')
+        for row in rows:
+            projection = _projection(*row)
+            found[row[0]] = projection
+            loaded[to_load[row[0]]] = (generation, projection)
+        if loaded:
+            shared.set_many(loaded, timeout=settings.SCAN_CACHE_TIMEOUT)
+            # An invalidation that ran after the read above either deleted these entries already
+            # or left a mark (or a new token) that is visible here.
+            checks = shared.get_many([GENERATION_KEY, *map(_mark, loaded)])
+            if checks.get(GENERATION_KEY) != generation:
+                shared.delete_many(list(loaded))
+                return found
+            stale = [key for key in loaded if _mark(key) in checks]
+            if stale:
+                shared.delete_many(stale)
+            for key in loaded.keys() - set(stale):
+                local.set(key, loaded[key][1])
+    return found
+
+
+def lookup(equipment_id):
+    """Return ``{'id', 'name', 'status', 'location'}`` for the item, or None if there is no such item."""
+    try:
+        equipment_id = uuid.UUID(str(equipment_id))
+    except ValueError:
+        return None
+    return lookup_many([equipment_id]).get(equipment_id)
+
+
+def _drop(ids) -> None:
+    local, shared = _local_cache(), _shared()
+    if ids is None:
+        local.clear()
+        shared.set(GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+        return
+    keys = [_key(uuid.UUID(str(equipment_id))) for equipment_id in ids]
+    local.delete_many(keys)
+    # The mark goes in before the delete, so a concurrent lookup either sees it or is deleted.
+    shared.set_many(dict.fromkeys(map(_mark, keys), True), timeout=INVALIDATION_HOLD)
+    shared.delete_many(keys)
+
+
+def invalidate(ids) -> None:
+    """Forget the given items (all items if ``ids`` is None) once the current transaction commits."""
+    transaction.on_commit(lambda: _drop(ids))
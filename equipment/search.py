@@ -0,0 +1,46 @@
+import re
+import uuid
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+
+from .models import SEARCH_CONFIG
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def prefix_query(text: str):
+    """``to_tsquery`` matching every word of ``text`` as a stemmed prefix, or None for no words.
+
+    Only word characters reach the query, so user input cannot inject tsquery operators.
+    """
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_equipment(queryset, text: str):
+    """Rank ``queryset`` against ``text`` using only indexed predicates.
+
+    Full-text prefix matches use the ``search_vector`` GIN index and typo-tolerant matches use the
+    ``pg_trgm`` GIN indexes on name and description. A UUID is looked up by primary key.
+    """
+    text = text.strip()
+    try:
+        return queryset.filter(id=uuid.UUID(text))
+    except ValueError:
+        pass
+    query = prefix_query(text)
+    if query is None:
+        return queryset.none()
+    return (
+        queryset
+        .filter(
+            Q(search_vector=query)
+            | Q(name__trigram_word_similar=text)
+            | Q(description__trigram_word_similar=text)
+        )
+        .annotate(rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(text, 'name'))
+        .order_by('-rank', 'name')
+    )
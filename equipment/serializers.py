@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from . import qr
 from .models import Equipment, EquipmentCategory, EquipmentPhoto, Location
 
 
@@ -12,21 +13,62 @@ class EquipmentCategorySerializer(serializers.ModelSerializer):
 class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Location
-        fields = ('id', 'name', 'parent', 'description')
+        fields = ('id', 'name', 'parent', 'description', 'path')
+        read_only_fields = ('path',)
+
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None and self.instance.is_ancestor_of(parent):
+            raise serializers.ValidationError('A location cannot be nested inside itself.')
+        return parent
 
 
 class EquipmentPhotoSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = EquipmentPhoto
-        fields = ('id', 'image', 'uploaded_at')
+        fields = ('id', 'image', 'uploaded_at', 'variants', 'srcset')
         read_only_fields = ('id', 'uploaded_at')
 
+    def _variant_urls(self, photo):
+        """``{width: {format: url}}`` sorted by width; empty until the variant worker has run."""
+        if photo.variants_status != EquipmentPhoto.VariantsStatus.READY:
+            return {}
+        storage = photo.image.storage
+        request = self.context.get('request')
+        urls = {}
+        for width in sorted(photo.variants, key=int):
+            urls[int(width)] = {}
+            for image_format, name in photo.variants[width].items():
+                url = storage.url(name)
+                urls[int(width)][image_format] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    def get_variants(self, photo):
+        return self._variant_urls(photo)
+
+    def get_srcset(self, photo):
+        srcset = {}
+        for width, formats in self._variant_urls(photo).items():
+            for image_format, url in formats.items():
+                srcset.setdefault(image_format, []).append(f'{url} {width}w')
+        return {image_format: ', '.join(entries) for image_format, entries in srcset.items()}
+
 
 class EquipmentSerializer(serializers.ModelSerializer):
     photos = EquipmentPhotoSerializer(many=True, read_only=True)
     category_detail = EquipmentCategorySerializer(source='category', read_only=True)
     location_detail = LocationSerializer(source='location', read_only=True)
 
+    expandable_fields = ('category_detail', 'location_detail', 'photos')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Equipment
         fields = (
@@ -44,3 +86,35 @@ class EquipmentSerializer(serializers.ModelSerializer):
             'photos',
         )
         read_only_fields = ('id', 'created_at', 'updated_at')
+
+
+class EquipmentSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class QRRenderSerializer(serializers.Serializer):
+    format = serializers.ChoiceField(choices=tuple(qr.RENDERERS), default='png')
+    box_size = serializers.IntegerField(min_value=1, max_value=40, default=qr.DEFAULT_BOX_SIZE)
+    border = serializers.IntegerField(min_value=0, max_value=16, default=qr.DEFAULT_BORDER)
+
+
+class QRBulkSerializer(serializers.Serializer):
+    layout = serializers.ChoiceField(choices=(('page', 'One code per page'), ('sheet', 'Label sheet')), default='page')
+    cols = serializers.IntegerField(min_value=1, max_value=8, default=3)
+    rows = serializers.IntegerField(min_value=1, max_value=16, default=8)
+    render = serializers.ChoiceField(choices=(('raster', 'Raster'), ('vector', 'Vector')), default='raster')
+
+
+class EquipmentBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=1000)
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), required=False)
+    status = serializers.ChoiceField(
+        choices=(Equipment.Status.IN_REPAIR, Equipment.Status.WRITTEN_OFF), required=False,
+    )
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if 'location' not in attrs and 'status' not in attrs:
+            raise serializers.ValidationError('location or status required')
+        return attrs
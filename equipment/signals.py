@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import scan_cache
+from .models import CatalogVersion, Equipment, EquipmentCategory, EquipmentPhoto, Location
+
+# Sent with ``ids`` (a list of equipment ids, or None when too many to list) whenever equipment
+# rows change, including set-based writes that bypass ``post_save``.
+equipment_changed = Signal()
+
+# Catalogue collections whose list responses include each model's rows.
+CATALOG_TABLES = {
+    Equipment: ('equipment',),
+    EquipmentPhoto: ('equipment',),
+    EquipmentCategory: ('categories', 'equipment'),
+    Location: ('locations', 'equipment'),
+}
+
+
+class CatalogBumps:
+    """``on_commit`` callback advancing every collection a transaction wrote to, once each."""
+
+    def __init__(self):
+        self.names = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        # A fixed order keeps concurrent commits from deadlocking on the counter rows.
+        for name in sorted(self.names):
+            CatalogVersion.bump(name)
+
+
+def bump_catalog(*names):
+    """Advance the versions once the surrounding transaction commits, so readers never lock on them.
+
+    All writes of one transaction share a single callback, so a collection's counter row is
+    updated once per transaction rather than once per saved row.
+    """
+    connection = transaction.get_connection()
+    bumps = getattr(connection, 'catalog_bumps', None)
+    # A rolled-back transaction discards its callback; a new one is registered in its place.
+    if (
+        not connection.in_atomic_block
+        or bumps is None
+        or bumps.done
+        or not any(callback is bumps for _, callback, _ in connection.run_on_commit)
+    ):
+        bumps = connection.catalog_bumps = CatalogBumps()
+        bumps.names.update(names)
+        transaction.on_commit(bumps)
+    else:
+        bumps.names.update(names)
+
+
+@receiver(pre_delete, sender=Location)
+def reroot_children(sender, instance, **kwargs):
+    """Children of a deleted location become roots (``SET_NULL``), so strip its prefix from their paths."""
+    if instance.path:
+        (
+            Location.objects
+            .filter(path__startswith=instance.path)
+            .exclude(pk=instance.pk)
+            .update(path=Substr('path', len(instance.path)))
+        )
+
+
+@receiver(post_delete, sender=Location)
+def detach_location_items(sender, instance, **kwargs):
+    # Its items were detached by ``SET_NULL``, a bulk UPDATE that sends no per-row signals.
+    equipment_changed.send(sender=Equipment, ids=None)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def catalog_row_changed(sender, instance, **kwargs):
+    if sender is Equipment:
+        equipment_changed.send(sender=Equipment, ids=[instance.pk])
+    elif sender in CATALOG_TABLES:
+        bump_catalog(*CATALOG_TABLES[sender])
+
+
+@receiver(equipment_changed)
+def equipment_rows_changed(sender, ids, **kwargs):
+    bump_catalog(*CATALOG_TABLES[Equipment])
+    scan_cache.invalidate(ids)
@@ -1,22 +1,359 @@
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+from PIL import Image
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Equipment, EquipmentCategory
+from . import labels, qr
+from .importing import import_equipment
+from .models import CatalogVersion, Equipment, EquipmentCategory, EquipmentPhoto, Location
+from .photos import process_pending
 
 User = get_user_model()
+# Files the tests write land here and are removed when the run ends.
+TEST_FILES = tempfile.TemporaryDirectory()
 
 
+@override_settings(QR_RENDER_WORKERS=1, QR_CACHE_DIR=f'{TEST_FILES.name}/qr',
+                   MEDIA_ROOT=f'{TEST_FILES.name}/media')
 class EquipmentTests(APITestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = User.objects.create_user(username='user', password='pass')
         self.client.force_authenticate(self.user)
-        self.category = EquipmentCategory.objects.create(name='Станок')
-        self.equipment = Equipment.objects.create(name='Токарный станок', category=self.category)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = EquipmentCategory.objects.create(name='Станок')
+            self.equipment = Equipment.objects.create(name='Токарный станок', category=self.category)
 
     def test_qr_endpoint(self):
         url = reverse('equipment-qr', kwargs={'pk': self.equipment.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'image/png')
+
+    def test_qr_conditional_get(self):
+        url = reverse('equipment-qr', kwargs={'pk': self.equipment.id})
+        first = self.client.get(url)
+        self.assertIn('immutable', first['Cache-Control'])
+        cached = self.client.get(url)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['ETag'], first['ETag'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        larger = self.client.get(url, {'box_size': 20})
+        self.assertNotEqual(larger['ETag'], first['ETag'])
+
+    def test_list_is_cursor_paginated(self):
+        for index in range(3):
+            Equipment.objects.create(name=f'Дрель {index}', category=self.category)
+        url = reverse('equipment-list')
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pages_through_equal_timestamps(self):
+        for index in range(7):
+            Equipment.objects.create(name=f'Ключ {index}', category=self.category)
+        # Same stamp as a bulk import gives every row of its batch.
+        Equipment.objects.update(updated_at=timezone.now())
+        url = reverse('equipment-list')
+        seen = []
+        pages = []
+        response = self.client.get(url, {'page_size': 3, 'fields': 'id'})
+        while True:
+            pages.append([item['id'] for item in response.data['results']])
+            seen.extend(pages[-1])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(str(pk) for pk in Equipment.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['id'] for item in response.data['results']], pages[1])
+
+    def test_sparse_fieldset_list(self):
+        for index in range(5):
+            Equipment.objects.create(name=f'Ключ {index}', category=self.category)
+        url = reverse('equipment-list')
+        # The catalogue version lookup comes first, then the list query.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id,name,status'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'status'})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'fields': 'id,name', 'expand': 'category_detail,photos'})
+        self.assertEqual(response.data['results'][0]['category_detail']['name'], 'Станок')
+        self.assertEqual(response.data['results'][0]['photos'], [])
+        response = self.client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_qr_svg_format(self):
+        url = reverse('equipment-qr', kwargs={'pk': self.equipment.id})
+        response = self.client.get(url, {'format': 'svg'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<svg'))
+        matrix = qr.qr_matrix(str(self.equipment.id))
+        runs = ''.join(f'M{x} {y}.5h{length}' for x, y, length in qr.dark_runs(matrix))
+        self.assertIn(f'viewBox="0 0 {len(matrix)} {len(matrix)}"'.encode(), response.content)
+        self.assertIn(f'<path d="{runs}" stroke="#000"/>'.encode(), response.content)
+
+    def test_render_cache_eviction_skips_partial_writes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = qr.RenderCache(directory.name, max_bytes=10)
+        old, new = 'aa' + '0' * 62, 'ab' + '0' * 62
+        cache.put(old, 'png', b'x' * 8)
+        os.utime(cache.path_for(old, 'png'), (0, 0))
+        partial = cache.path_for(old, 'png').with_name('upload.tmp')
+        partial.write_bytes(b'z' * 20)
+        cache.put(new, 'png', b'y' * 8)
+        self.assertIsNone(cache.get(old, 'png'))
+        self.assertEqual(cache.get(new, 'png'), b'y' * 8)
+        self.assertTrue(partial.exists())
+
+    def test_qr_bulk_label_sheet_is_streamed(self):
+        Equipment.objects.create(name='Шуруповёрт', category=self.category)
+        url = reverse('equipment-qr-bulk')
+        response = self.client.get(url, {'layout': 'sheet', 'cols': 2, 'rows': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'/Count 1', content)
+
+    def test_qr_bulk_vector_sheet(self):
+        url = reverse('equipment-qr-bulk')
+        response = self.client.get(url, {'layout': 'sheet', 'render': 'vector'})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertNotIn(b'/Width 1240', content)
+        payload = str(self.equipment.id)
+        page, images, masks = labels.render_vector_page(labels.SheetLayout(), [(payload, '')])
+        runs = [b'%d %d %d 1 re' % run for run in qr.dark_runs(qr.qr_matrix(payload, border=2))]
+        self.assertEqual((images, masks), ([], []))
+        self.assertIn(b'\n'.join(runs) + b'\nf Q', page)
+
+    def test_label_pool_is_replaced_after_a_worker_dies(self):
+        broken = mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool))
+        items = [(str(self.equipment.id), 'Станок')] * 3
+        with mock.patch.multiple(labels, _executor=broken, _executor_workers=2), mock.patch.object(
+            labels, 'ProcessPoolExecutor', lambda max_workers, mp_context: ThreadPoolExecutor(max_workers),
+        ):
+            content = b''.join(labels.stream_label_pdf(iter(items), labels.SheetLayout(cols=1, rows=1), workers=2))
+            fresh = labels._executor
+            # A second stream that saw the same breakage leaves the replacement alone.
+            labels._discard_executor(broken)
+            self.assertIs(labels._executor, fresh)
+            fresh.shutdown()
+        broken.shutdown.assert_called_once()
+        self.assertIn(b'/Count 3', content)
+
+    def test_search_ranks_prefix_and_typo_matches(self):
+        Equipment.objects.create(name='Дрель аккумуляторная', description='Ударная, 18 В')
+        Equipment.objects.create(name='Перчатки защитные')
+        url = reverse('equipment-search')
+        response = self.client.get(url, {'q': 'дрел'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Дрель аккумуляторная'])
+        response = self.client.get(url, {'q': 'перчатки защитнные', 'fields': 'id,name'})
+        self.assertEqual([item['name'] for item in response.data['results']], ['Перчатки защитные'])
+        response = self.client.get(url, {'q': str(self.equipment.id)})
+        self.assertEqual(response.data['results'][0]['name'], 'Токарный станок')
+
+    def test_location_paths_follow_moves_and_deletes(self):
+        hall = Location.objects.create(name='Цех')
+        rack = Location.objects.create(name='Стеллаж', parent=hall)
+        shelf = Location.objects.create(name='Полка', parent=rack)
+        self.assertEqual(shelf.path, f'/{hall.id}/{rack.id}/{shelf.id}/')
+        store = Location.objects.create(name='Склад')
+        rack.parent = store
+        rack.save()
+        shelf.refresh_from_db()
+        self.assertEqual(shelf.path, f'/{store.id}/{rack.id}/{shelf.id}/')
+        with self.assertRaises(ValueError):
+            store.parent = shelf
+            store.save()
+        rack.delete()
+        shelf.refresh_from_db()
+        self.assertEqual(shelf.path, f'/{shelf.id}/')
+
+    def test_location_tree_counts(self):
+        hall = Location.objects.create(name='Цех')
+        rack = Location.objects.create(name='Стеллаж', parent=hall)
+        shelf = Location.objects.create(name='Полка', parent=rack)
+        Equipment.objects.create(name='Дрель', location=rack)
+        Equipment.objects.create(name='Фреза', location=shelf)
+        Equipment.objects.create(name='Пила', location=shelf)
+        self.equipment.location = hall
+        self.equipment.save()
+        url = reverse('locations-tree', kwargs={'pk': hall.id})
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['equipment_count'], 1)
+        self.assertEqual(response.data['total_equipment_count'], 4)
+        rack_node = response.data['children'][0]
+        self.assertEqual((rack_node['equipment_count'], rack_node['total_equipment_count']), (1, 3))
+        self.assertEqual(rack_node['children'][0]['equipment_count'], 2)
+        self.user.role = 'storekeeper'
+        self.user.save()
+        response = self.client.patch(
+            reverse('locations-detail', kwargs={'pk': hall.id}), {'parent': shelf.id}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_photo_variants_are_upright_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display.
+        exif[0x010F] = 'Camera maker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), (200, 10, 10)).save(buffer, format='JPEG', exif=exif)
+        photo = EquipmentPhoto.objects.create(
+            equipment=self.equipment,
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+        self.assertEqual(photo.variants_status, EquipmentPhoto.VariantsStatus.PENDING)
+        self.assertEqual(process_pending(), 1)
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants_status, EquipmentPhoto.VariantsStatus.READY)
+        self.assertEqual(sorted(photo.variants, key=int), ['64', '256'])
+        with photo.image.storage.open(photo.variants['64']['jpeg']) as variant_file:
+            variant = Image.open(variant_file)
+            self.assertEqual(variant.size, (64, 128))
+            self.assertEqual(len(variant.getexif()), 0)
+        url = reverse('equipment-detail', kwargs={'pk': self.equipment.id})
+        response = self.client.get(url, {'fields': 'id', 'expand': 'photos'})
+        srcset = response.data['photos'][0]['srcset']
+        self.assertEqual(set(srcset), {'jpeg', 'webp'})
+        self.assertRegex(srcset['webp'], r'/64\.webp 64w, .*/256\.webp 256w$')
+
+    def test_import_csv_via_api(self):
+        self.user.role = 'storekeeper'
+        self.user.save()
+        rows = [
+            'Наименование;Категория;Местоположение;Статус',
+            'Фреза;Станок;Склад / Стеллаж 1;',
+            'Пила;Инструменты;Склад / Стеллаж 1;В ремонте',
+            ';Инструменты;Склад;',
+            'Ключ;Инструменты;Склад;потерян',
+            f'Токарный станок ЧПУ;Станок;Склад;{Equipment.Status.IN_STOCK}',
+        ]
+        upload = SimpleUploadedFile('items.csv', '\n'.join(rows).encode('utf-8-sig'), content_type='text/csv')
+        response = self.client.post(reverse('equipment-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rows'], response.data['imported'], response.data['failed']), (5, 3, 2))
+        self.assertTrue(response.data['report'].endswith('-errors.csv'))
+        shelf = Location.objects.get(name='Стеллаж 1')
+        self.assertEqual(shelf.parent.name, 'Склад')
+        self.assertEqual(Equipment.objects.get(name='Пила').status, Equipment.Status.IN_REPAIR)
+        self.assertEqual(Equipment.objects.get(name='Фреза').category, self.category)
+        self.assertEqual(EquipmentCategory.objects.count(), 2)
+
+    def test_import_xlsx_command_updates_by_id(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['id', 'name', 'description'])
+        sheet.append([str(self.equipment.id), 'Токарный станок 1К62', 'Переименован'])
+        sheet.append([None, 'Дрель', None])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = f'{directory.name}/items.xlsx'
+        workbook.save(path)
+        output = io.StringIO()
+        call_command('import_equipment', path, '--batch-size', '1', stdout=output)
+        self.assertIn('2 imported, 0 failed of 2 rows', output.getvalue())
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.name, 'Токарный станок 1К62')
+        self.assertEqual(self.equipment.description, 'Переименован')
+        self.assertEqual(self.equipment.category, self.category)
+        self.assertTrue(Equipment.objects.filter(name='Дрель').exists())
+
+    def test_import_update_keeps_omitted_fields_and_status(self):
+        shelf = Location.objects.create(name='Стеллаж')
+        Equipment.objects.filter(pk=self.equipment.pk).update(
+            location=shelf, status=Equipment.Status.ISSUED, responsible_user=self.user,
+        )
+        rows = ['id,name,status', f'{self.equipment.id},Токарный станок 1К62,in_stock']
+        upload = SimpleUploadedFile('items.csv', '\n'.join(rows).encode(), content_type='text/csv')
+        stats = import_equipment(upload, 'items.csv')
+        self.assertEqual((stats['imported'], stats['failed']), (1, 0))
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.name, 'Токарный станок 1К62')
+        self.assertEqual((self.equipment.category, self.equipment.location), (self.category, shelf))
+        self.assertEqual((self.equipment.status, self.equipment.responsible_user), (Equipment.Status.ISSUED, self.user))
+
+    def test_bulk_move_and_status_change(self):
+        self.user.role = 'storekeeper'
+        self.user.save()
+        rack = Location.objects.create(name='Стеллаж')
+        drill = Equipment.objects.create(name='Дрель', location=rack)
+        issued = Equipment.objects.create(name='Пила', status=Equipment.Status.ISSUED)
+        missing_id = '00000000-0000-0000-0000-000000000000'
+        url = reverse('equipment-bulk')
+        # Location lookup, savepoint, locking SELECT, one UPDATE, one INSERT, release.
+        with self.assertNumQueries(6):
+            response = self.client.post(url, {
+                'ids': [str(self.equipment.id), str(drill.id), str(issued.id), missing_id],
+                'location': rack.id,
+                'status': Equipment.Status.IN_REPAIR,
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        outcomes = {str(item['id']): item['outcome'] for item in response.data['results']}
+        self.assertEqual(outcomes, {
+            str(self.equipment.id): 'updated',
+            str(drill.id): 'updated',
+            str(issued.id): 'conflict',
+            missing_id: 'not_found',
+        })
+        self.equipment.refresh_from_db()
+        self.assertEqual((self.equipment.location, self.equipment.status), (rack, Equipment.Status.IN_REPAIR))
+        actions = sorted(self.equipment.operations.values_list('action_type', flat=True))
+        self.assertEqual(actions, ['move', 'repair'])
+        self.assertEqual(list(drill.operations.values_list('action_type', flat=True)), ['repair'])
+        response = self.client.post(url, {'ids': [str(drill.id)], 'location': rack.id}, format='json')
+        self.assertEqual(response.data['results'][0]['outcome'], 'unchanged')
+
+    def test_catalog_lists_answer_not_modified(self):
+        url = reverse('equipment-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'fields': 'id'})['ETag'], etag)
+        # An If-Modified-Since alone never yields a 304: the second-resolution date can be stale.
+        modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified).status_code, 200)
+        version = CatalogVersion.current('equipment').version
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipment.objects.create(name='Дрель')
+            Equipment.objects.create(name='Пила')
+        self.assertEqual(CatalogVersion.current('equipment').version, version + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        categories_url = reverse('categories-list')
+        etag = self.client.get(categories_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Станки'
+            self.category.save()
+        self.assertEqual(self.client.get(categories_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -1,61 +1,346 @@
-import io
+import csv
+import hashlib
+import tempfile
+import uuid
+import zipfile
 
-import qrcode
-from PIL import Image
-from django.http import HttpResponse
-from rest_framework import viewsets
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
-from .models import Equipment, EquipmentCategory, Location
-from .serializers import EquipmentCategorySerializer, EquipmentSerializer, LocationSerializer
-from users.permissions import ReadOnlyOrStorekeeper
+from . import labels
+from . import qr as qr_render
+from .importing import import_equipment
+from .models import CatalogVersion, Equipment, EquipmentCategory, EquipmentPhoto, Location
+from .search import search_equipment
+from .serializers import (
+    EquipmentBulkSerializer,
+    EquipmentCategorySerializer,
+    EquipmentSearchSerializer,
+    EquipmentSerializer,
+    LocationSerializer,
+    QRBulkSerializer,
+    QRRenderSerializer,
+)
+from .signals import equipment_changed
+from operations.models import Operation
+from operations.serializers import OperationSerializer
+from smart_warehouse.pagination import EquipmentCursorPagination, OperationCursorPagination
+from users.permissions import IsObserverOrAbove, ReadOnlyOrStorekeeper
 
 
-class EquipmentCategoryViewSet(viewsets.ModelViewSet):
+class ConditionalListMixin:
+    """Answer unchanged list requests with ``304 Not Modified`` before running the list query.
+
+    Validators come from the ``CatalogVersion`` counter of ``catalog_name``, which every write to
+    the collection advances, so checking them costs one primary-key lookup. Only the ETag is
+    compared: ``Last-Modified`` has one-second resolution, so a write in the same second as a
+    client's copy would still answer ``If-Modified-Since`` with a stale 304.
+    """
+
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        version = CatalogVersion.current(self.catalog_name)
+        query = hashlib.sha256(request.get_full_path().encode('utf-8')).hexdigest()[:16]
+        etag = f'"{self.catalog_name}-{version.version}-{query}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            response['Last-Modified'] = http_date(version.changed_at.timestamp())
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class EquipmentCategoryViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    catalog_name = 'categories'
     queryset = EquipmentCategory.objects.all().order_by('name')
     serializer_class = EquipmentCategorySerializer
     permission_classes = [ReadOnlyOrStorekeeper]
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    catalog_name = 'locations'
     queryset = Location.objects.all().order_by('name')
     serializer_class = LocationSerializer
     permission_classes = [ReadOnlyOrStorekeeper]
 
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        """The location's subtree with direct and total equipment counts per node.
+
+        Three queries: the root, its subtree in path order and the item counts per location.
+        """
+        root = self.get_object()
+        nodes = list(root.subtree().order_by('path').values('id', 'name', 'parent_id', 'path'))
+        counts = dict(
+            Equipment.objects.filter(location__path__startswith=root.path)
+            .values_list('location_id')
+            .annotate(count=Count('id'))
+        )
+        by_id = {}
+        for node in nodes:
+            count = counts.get(node['id'], 0)
+            by_id[node['id']] = {
+                'id': node['id'],
+                'name': node['name'],
+                'equipment_count': count,
+                'total_equipment_count': count,
+                'children': [],
+            }
+        # Ordered by path, so every parent precedes its descendants; fold totals bottom-up.
+        for node in reversed(nodes):
+            if node['id'] != root.id:
+                parent = by_id[node['parent_id']]
+                parent['total_equipment_count'] += by_id[node['id']]['total_equipment_count']
+        for node in nodes:
+            if node['id'] != root.id:
+                by_id[node['parent_id']]['children'].append(by_id[node['id']])
+        for node in by_id.values():
+            node['children'].sort(key=lambda child: child['name'])
+        return Response(by_id[root.id])
+
+
+BULK_STATUS_ACTIONS = {
+    Equipment.Status.IN_REPAIR: Operation.ActionType.REPAIR,
+    Equipment.Status.WRITTEN_OFF: Operation.ActionType.WRITE_OFF,
+}
+
+
+def _split_param(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
 
-class EquipmentViewSet(viewsets.ModelViewSet):
-    queryset = Equipment.objects.select_related('category', 'location', 'responsible_user').all()
+
+class EquipmentViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    catalog_name = 'equipment'
+    queryset = Equipment.objects.defer('search_vector')
     serializer_class = EquipmentSerializer
     permission_classes = [ReadOnlyOrStorekeeper]
+    pagination_class = EquipmentCursorPagination
+
+    def get_requested_fields(self):
+        """Fields selected with ``?fields=`` / ``?expand=``, or None for the full representation."""
+        if hasattr(self, '_requested_fields'):
+            return self._requested_fields
+        params = self.request.query_params
+        fields = None
+        if self.request.method in permissions.SAFE_METHODS and ('fields' in params or 'expand' in params):
+            available = EquipmentSerializer.Meta.fields
+            expandable = EquipmentSerializer.expandable_fields
+            requested = _split_param(params.get('fields')) or [
+                name for name in available if name not in expandable
+            ]
+            requested += _split_param(params.get('expand'))
+            unknown = sorted(set(requested) - set(available))
+            if unknown:
+                raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown)}'})
+            fields = tuple(name for name in available if name == 'id' or name in requested)
+        self._requested_fields = fields
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('qr', 'qr_bulk', 'import_file', 'bulk', 'history'):
+            return queryset
+        fields = self.get_requested_fields()
+        if fields is None:
+            fields = EquipmentSerializer.Meta.fields
+        else:
+            # Ordering columns stay loaded so the paginator can build cursors without extra queries.
+            model_columns = {field.name for field in Equipment._meta.concrete_fields}
+            columns = {'id', 'updated_at'} | {name for name in fields if name in model_columns}
+            if 'category_detail' in fields:
+                columns.add('category')
+            if 'location_detail' in fields:
+                columns.add('location')
+            queryset = queryset.only(*columns)
+        if 'category_detail' in fields:
+            queryset = queryset.select_related('category')
+        if 'location_detail' in fields:
+            queryset = queryset.select_related('location')
+        if 'photos' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('photos', queryset=EquipmentPhoto.objects.order_by('id')),
+            )
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        params = EquipmentSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = search_equipment(self.get_queryset(), params.validated_data['q'])
+        serializer = self.get_serializer(queryset[:params.validated_data['limit']], many=True)
+        return Response({'results': serializer.data})
+
+    @action(detail=True, methods=['get'], permission_classes=[IsObserverOrAbove])
+    def history(self, request, pk=None):
+        """Cursor-paginated operations of one item, newest first, read from one index range."""
+        try:
+            equipment_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise NotFound()
+        paginator = OperationCursorPagination()
+        page = paginator.paginate_queryset(Operation.objects.filter(equipment_id=equipment_id), request, view=self)
+        # Only an empty first page needs to tell an unknown item from one without history.
+        if not page and 'cursor' not in request.query_params:
+            self.get_object()
+        return paginator.get_paginated_response(OperationSerializer(page, many=True).data)
 
     @action(detail=True, methods=['get'])
     def qr(self, request, pk=None):
         equipment = self.get_object()
-        img = qrcode.make(equipment.qr_payload)
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        return HttpResponse(buffer.read(), content_type='image/png')
+        options = QRRenderSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
+        image_format = options.validated_data['format']
+        box_size = options.validated_data['box_size']
+        border = options.validated_data['border']
+        # The payload never changes for a given item, so the render key doubles as a strong validator.
+        etag = f'"{qr_render.render_key(equipment.qr_payload, image_format, box_size, border)}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data = qr_render.get_image(equipment.qr_payload, image_format, box_size, border)
+            response = HttpResponse(data, content_type=qr_render.RENDERERS[image_format][1])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
 
     @action(detail=False, methods=['get'])
     def qr_bulk(self, request):
+        options = QRBulkSerializer(data=request.query_params)
+        options.is_valid(raise_exception=True)
         ids = request.query_params.getlist('ids')
         queryset = self.get_queryset()
         if ids:
             queryset = queryset.filter(id__in=ids)
-        images = []
-        for equipment in queryset:
-            img = qrcode.make(equipment.qr_payload)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            images.append(img)
-        if not images:
+        if not queryset.exists():
             return Response({'detail': 'No equipment found'}, status=404)
-        buffer = io.BytesIO()
-        first, rest = images[0], images[1:]
-        first.save(buffer, format='PDF', save_all=True, append_images=rest)
-        buffer.seek(0)
-        response = HttpResponse(buffer.read(), content_type='application/pdf')
+        if options.validated_data['layout'] == 'sheet':
+            layout = labels.SheetLayout(
+                cols=options.validated_data['cols'],
+                rows=options.validated_data['rows'],
+                captions=True,
+                font_path=settings.QR_LABEL_FONT,
+            )
+        else:
+            layout = labels.SheetLayout()
+        rows = queryset.order_by('name', 'id').values_list('id', 'name').iterator(chunk_size=2000)
+        items = ((str(pk), name) for pk, name in rows)
+        response = StreamingHttpResponse(
+            labels.stream_label_pdf(
+                items,
+                layout,
+                vector=options.validated_data['render'] == 'vector',
+                workers=settings.QR_RENDER_WORKERS,
+            ),
+            content_type='application/pdf',
+        )
         response['Content-Disposition'] = 'attachment; filename="equipment_qr.pdf"'
         return response
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'file is required'}, status=400)
+        with tempfile.TemporaryFile('w+', newline='', encoding='utf-8-sig') as report:
+            try:
+                stats = import_equipment(upload, upload.name, csv.writer(report))
+            except (ValueError, zipfile.BadZipFile) as exc:
+                return Response({'detail': str(exc)}, status=400)
+            stats['report'] = None
+            if stats['failed']:
+                report.seek(0)
+                name = default_storage.save(
+                    f'imports/{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}-errors.csv', File(report),
+                )
+                stats['report'] = request.build_absolute_uri(default_storage.url(name))
+        return Response(stats)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Move equipment and/or change its status with one UPDATE, logging an operation per change.
+
+        Each id gets an outcome: ``updated``, ``unchanged``, ``not_found`` or ``conflict`` (issued
+        or written-off items are left alone).
+        """
+        serializer = EquipmentBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        location = serializer.validated_data.get('location')
+        new_status = serializer.validated_data.get('status')
+        notes = serializer.validated_data['notes']
+        outcomes = {}
+        operations = []
+        with transaction.atomic():
+            # Locking in primary-key order keeps concurrent bulk requests from deadlocking.
+            current = {
+                pk: (item_status, location_id)
+                for pk, item_status, location_id in self.get_queryset()
+                .select_for_update()
+                .filter(id__in=ids)
+                .order_by('id')
+                .values_list('id', 'status', 'location_id')
+            }
+            for pk in ids:
+                if pk not in current:
+                    outcomes[pk] = 'not_found'
+                    continue
+                item_status, location_id = current[pk]
+                if item_status in (Equipment.Status.ISSUED, Equipment.Status.WRITTEN_OFF):
+                    outcomes[pk] = 'conflict'
+                    continue
+                moved = location is not None and location_id != location.id
+                changed_status = new_status is not None and item_status != new_status
+                if not moved and not changed_status:
+                    outcomes[pk] = 'unchanged'
+                    continue
+                outcomes[pk] = 'updated'
+                if moved:
+                    operations.append(Operation(
+                        equipment_id=pk,
+                        action_type=Operation.ActionType.MOVE,
+                        user=request.user,
+                        location_from_id=location_id,
+                        location_to=location,
+                        notes=notes,
+                    ))
+                if changed_status:
+                    operations.append(Operation(
+                        equipment_id=pk,
+                        action_type=BULK_STATUS_ACTIONS[new_status],
+                        user=request.user,
+                        location_from_id=location_id,
+                        notes=notes,
+                    ))
+            updated_ids = [pk for pk, outcome in outcomes.items() if outcome == 'updated']
+            if updated_ids:
+                changes = {'updated_at': timezone.now()}
+                if location is not None:
+                    changes['location'] = location
+                if new_status is not None:
+                    changes['status'] = new_status
+                Equipment.objects.filter(id__in=updated_ids).update(**changes)
+                Operation.objects.bulk_create(operations)
+                equipment_changed.send(sender=Equipment, ids=updated_ids)
+        return Response({
+            'updated': len(updated_ids),
+            'results': [{'id': pk, 'outcome': outcome} for pk, outcome in outcomes.items()],
+        })
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_scanned_lists(apps, schema_editor):
+    InventorySession = apps.get_model('inventory', 'InventorySession')
+    InventoryScan = apps.get_model('inventory', 'InventoryScan')
+    Equipment = apps.get_model('equipment', 'Equipment')
+    for session in InventorySession.objects.exclude(result={}).iterator():
+        scanned = session.result.pop('scanned', None)
+        if scanned is None:
+            continue
+        known = Equipment.objects.filter(id__in=scanned).values_list('id', flat=True)
+        InventoryScan.objects.bulk_create(
+            [InventoryScan(session=session, equipment_id=equipment_id) for equipment_id in known],
+            ignore_conflicts=True,
+        )
+        session.result['scanned_count'] = len(scanned)
+        session.save(update_fields=['result'])
+
+
+def restore_scanned_lists(apps, schema_editor):
+    InventorySession = apps.get_model('inventory', 'InventorySession')
+    for session in InventorySession.objects.iterator():
+        session.result.pop('scanned_count', None)
+        scanned = session.scans.values_list('equipment_id', flat=True)
+        session.result['scanned'] = sorted(str(equipment_id) for equipment_id in scanned)
+        session.save(update_fields=['result'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0009_current_issue_no_constraint'),
+        ('inventory', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scanned_at', models.DateTimeField(auto_now_add=True)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='equipment.equipment')),
+                ('scanned_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scans', to='inventory.inventorysession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'equipment'), name='inventoryscan_unique_item')],
+            },
+        ),
+        migrations.RunPython(move_scanned_lists, restore_scanned_lists),
+    ]
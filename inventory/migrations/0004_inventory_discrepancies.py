@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+KINDS = ('missing', 'extra')
+
+
+def move_discrepancy_lists(apps, schema_editor):
+    InventorySession = apps.get_model('inventory', 'InventorySession')
+    InventoryDiscrepancy = apps.get_model('inventory', 'InventoryDiscrepancy')
+    Equipment = apps.get_model('equipment', 'Equipment')
+    for session in InventorySession.objects.filter(finished_at__isnull=False).iterator():
+        for kind in KINDS:
+            ids = session.result.pop(kind, None)
+            if ids is None:
+                continue
+            known = Equipment.objects.filter(id__in=ids).values_list('id', flat=True)
+            InventoryDiscrepancy.objects.bulk_create(
+                [InventoryDiscrepancy(session=session, equipment_id=equipment_id, kind=kind) for equipment_id in known],
+            )
+            session.result[f'{kind}_count'] = len(ids)
+        session.save(update_fields=['result'])
+
+
+def restore_discrepancy_lists(apps, schema_editor):
+    InventorySession = apps.get_model('inventory', 'InventorySession')
+    for session in InventorySession.objects.filter(finished_at__isnull=False).iterator():
+        for kind in KINDS:
+            session.result.pop(f'{kind}_count', None)
+            ids = session.discrepancies.filter(kind=kind).values_list('equipment_id', flat=True)
+            session.result[kind] = sorted(str(equipment_id) for equipment_id in ids)
+        session.save(update_fields=['result'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0009_current_issue_no_constraint'),
+        ('inventory', '0003_inventory_scans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('missing', 'Не найдено'), ('extra', 'Лишнее')], max_length=16)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='equipment.equipment')),
+                ('session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='inventory.inventorysession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'id'], name='discrepancy_session_idx'), models.Index(fields=['session', 'kind', 'id'], name='discrepancy_session_kind_idx')],
+            },
+        ),
+        migrations.RunPython(move_discrepancy_lists, restore_discrepancy_lists),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def freeze_existing_sessions(apps, schema_editor):
+    """Give earlier sessions an expected set: current stock if still open, else what finish recorded."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('''
+            INSERT INTO inventory_inventoryexpecteditem (session_id, equipment_id)
+            SELECT s.id, e.id FROM inventory_inventorysession s
+            JOIN equipment_equipment e ON s.location_id IS NULL OR e.location_id IN (
+                SELECT l.id FROM equipment_location l
+                WHERE l.path LIKE (SELECT path FROM equipment_location WHERE id = s.location_id) || '%'
+            )
+            WHERE s.finished_at IS NULL
+        ''')
+        cursor.execute('''
+            INSERT INTO inventory_inventoryexpecteditem (session_id, equipment_id)
+            SELECT session_id, equipment_id FROM inventory_inventorydiscrepancy d
+            JOIN inventory_inventorysession s ON s.id = d.session_id
+            WHERE s.finished_at IS NOT NULL AND d.kind = 'missing'
+            UNION
+            SELECT session_id, equipment_id FROM inventory_inventoryscan sc
+            JOIN inventory_inventorysession s ON s.id = sc.session_id
+            WHERE s.finished_at IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM inventory_inventorydiscrepancy d
+                WHERE d.session_id = sc.session_id AND d.equipment_id = sc.equipment_id AND d.kind = 'extra'
+            )
+        ''')
+        cursor.execute('''
+            UPDATE inventory_inventoryscan sc SET expected = EXISTS (
+                SELECT 1 FROM inventory_inventoryexpecteditem x
+                WHERE x.session_id = sc.session_id AND x.equipment_id = sc.equipment_id
+            )
+        ''')
+        cursor.execute('''
+            UPDATE inventory_inventorysession s SET
+                expected_count = (SELECT COUNT(*) FROM inventory_inventoryexpecteditem x WHERE x.session_id = s.id),
+                scanned_count = (SELECT COUNT(*) FROM inventory_inventoryscan sc WHERE sc.session_id = s.id),
+                extra_count = (
+                    SELECT COUNT(*) FROM inventory_inventoryscan sc WHERE sc.session_id = s.id AND NOT sc.expected
+                )
+        ''')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0009_current_issue_no_constraint'),
+        ('inventory', '0004_inventory_discrepancies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryscan',
+            name='expected',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='inventorysession',
+            name='expected_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventorysession',
+            name='extra_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventorysession',
+            name='scanned_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='InventoryExpectedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='equipment.equipment')),
+                ('session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='expected_items', to='inventory.inventorysession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'equipment'), name='inventoryexpected_unique_item')],
+            },
+        ),
+        migrations.RunPython(freeze_existing_sessions, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.db import connection, models, transaction
 
-from equipment.models import Location
+from equipment.models import Equipment, Location
 
 
 class InventorySession(models.Model):
@@ -10,6 +10,184 @@ class InventorySession(models.Model):
     finished_at = models.DateTimeField(null=True, blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     result = models.JSONField(default=dict, blank=True)
+    # Kept current by ``InventoryScan.objects.record`` so progress never recounts the scans.
+    expected_count = models.PositiveIntegerField(default=0, editable=False)
+    scanned_count = models.PositiveIntegerField(default=0, editable=False)
+    extra_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return f'Inventory {self.id}'
+
+    def expected_equipment(self):
+        """Items that should be found, whatever their status: the session's location subtree, or everything."""
+        if self.location_id:
+            return Equipment.objects.filter(location__path__startswith=self.location.path)
+        return Equipment.objects.all()
+
+    def freeze_expected(self) -> int:
+        """Record the items expected at the start of the session with one INSERT ... SELECT."""
+        expected_sql, expected_params = self.expected_equipment().values('id').query.sql_with_params()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {InventoryExpectedItem._meta.db_table} (session_id, equipment_id) '
+                f'SELECT %s, expected.id FROM ({expected_sql}) expected',
+                [self.id, *expected_params],
+            )
+            self.expected_count = cursor.rowcount
+            self.save(update_fields=['expected_count'])
+        return self.expected_count
+
+    def progress(self) -> dict:
+        found = self.scanned_count - self.extra_count
+        return {
+            'expected_count': self.expected_count,
+            'scanned_count': self.scanned_count,
+            'found_count': found,
+            'missing_count': self.expected_count - found,
+            'extra_count': self.extra_count,
+        }
+
+    def reconcile(self) -> dict:
+        """Replace the session's discrepancies with anti-joins of the frozen expected set and the scans.
+
+        Both differences are inserted by a single INSERT ... SELECT on the database side; only the
+        counts come back to Python.
+        """
+        discrepancies = InventoryDiscrepancy._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {discrepancies} WHERE session_id = %s', [self.id])
+            cursor.execute(
+                f'''
+                WITH expected AS (
+                    SELECT equipment_id AS id FROM {InventoryExpectedItem._meta.db_table} WHERE session_id = %s
+                ), scanned AS (
+                    SELECT equipment_id AS id FROM {InventoryScan._meta.db_table} WHERE session_id = %s
+                ), inserted AS (
+                    INSERT INTO {discrepancies} (session_id, equipment_id, kind)
+                    SELECT %s, expected.id, %s FROM expected
+                    WHERE NOT EXISTS (SELECT 1 FROM scanned WHERE scanned.id = expected.id)
+                    UNION ALL
+                    SELECT %s, scanned.id, %s FROM scanned
+                    WHERE NOT EXISTS (SELECT 1 FROM expected WHERE expected.id = scanned.id)
+                    RETURNING kind
+                )
+                SELECT
+                    (SELECT COUNT(*) FROM scanned),
+                    (SELECT COUNT(*) FROM inserted WHERE kind = %s),
+                    (SELECT COUNT(*) FROM inserted WHERE kind = %s)
+                ''',
+                [
+                    self.id, self.id,
+                    self.id, InventoryDiscrepancy.Kind.MISSING,
+                    self.id, InventoryDiscrepancy.Kind.EXTRA,
+                    InventoryDiscrepancy.Kind.MISSING, InventoryDiscrepancy.Kind.EXTRA,
+                ],
+            )
+            scanned, missing, extra = cursor.fetchone()
+        return {'scanned_count': scanned, 'missing_count': missing, 'extra_count': extra}
+
+
+class InventoryExpectedItem(models.Model):
+    session = models.ForeignKey(
+        InventorySession, on_delete=models.CASCADE, related_name='expected_items', db_index=False,
+    )
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'equipment'], name='inventoryexpected_unique_item'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.equipment_id} expected in {self.session_id}'
+
+
+class InventoryScanManager(models.Manager):
+    def record_many(self, session_id, equipment_ids, user_id):
+        """Record scans of ``equipment_ids`` (UUIDs) in one statement and advance the session's counters.
+
+        Repeats, within the batch or of earlier scans, are ignored by the unique constraint. Batches
+        that add scans also update the session's counters, so concurrent scanners of one session
+        take turns on its row for the rest of their statement; a batch of only repeats skips the
+        update. Returns ``(known, created, scanned_count)``: how many distinct ids exist, how many
+        were new to the session, and the session's total afterwards.
+        """
+        sessions = InventorySession._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH item AS (
+                    SELECT id FROM {Equipment._meta.db_table} WHERE id = ANY(%s::uuid[])
+                ), inserted AS (
+                    INSERT INTO {self.model._meta.db_table} (session_id, equipment_id, scanned_by_id, scanned_at, expected)
+                    SELECT %s, item.id, %s, NOW(), EXISTS (
+                        SELECT 1 FROM {InventoryExpectedItem._meta.db_table} expected
+                        WHERE expected.session_id = %s AND expected.equipment_id = item.id
+                    ) FROM item
+                    -- A fixed insertion order keeps overlapping batches from deadlocking each other.
+                    ORDER BY item.id
+                    ON CONFLICT (session_id, equipment_id) DO NOTHING
+                    RETURNING expected
+                ), counted AS (
+                    UPDATE {sessions} SET
+                        scanned_count = scanned_count + (SELECT COUNT(*) FROM inserted),
+                        extra_count = extra_count + (SELECT COUNT(*) FROM inserted WHERE NOT expected)
+                    WHERE id = %s AND EXISTS (SELECT 1 FROM inserted)
+                    RETURNING scanned_count
+                )
+                SELECT
+                    (SELECT COUNT(*) FROM item),
+                    (SELECT COUNT(*) FROM inserted),
+                    COALESCE(
+                        (SELECT scanned_count FROM counted),
+                        (SELECT scanned_count FROM {sessions} WHERE id = %s)
+                    )
+                ''',
+                [list(equipment_ids), session_id, user_id, session_id, session_id, session_id],
+            )
+            return cursor.fetchone()
+
+    def record(self, session_id, equipment_id, user_id):
+        """Record one scan. Returns ``(found, created, scanned_count)``; ``found`` is False for an unknown id."""
+        known, created, scanned_count = self.record_many(session_id, [equipment_id], user_id)
+        return bool(known), bool(created), scanned_count
+
+
+class InventoryScan(models.Model):
+    session = models.ForeignKey(InventorySession, on_delete=models.CASCADE, related_name='scans')
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='+')
+    scanned_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name='+')
+    scanned_at = models.DateTimeField(auto_now_add=True)
+    # Whether the item was in the session's expected set when it was scanned.
+    expected = models.BooleanField(default=False)
+
+    objects = InventoryScanManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'equipment'], name='inventoryscan_unique_item'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.equipment_id} in {self.session_id}'
+
+
+class InventoryDiscrepancy(models.Model):
+    class Kind(models.TextChoices):
+        MISSING = 'missing', 'Не найдено'
+        EXTRA = 'extra', 'Лишнее'
+
+    session = models.ForeignKey(
+        InventorySession, on_delete=models.CASCADE, related_name='discrepancies', db_index=False,
+    )
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'id'], name='discrepancy_session_idx'),
+            models.Index(fields=['session', 'kind', 'id'], name='discrepancy_session_kind_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()}: {self.equipment_id}'
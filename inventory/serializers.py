@@ -1,15 +1,32 @@
 from rest_framework import serializers
 
-from .models import InventorySession
+from .models import InventoryDiscrepancy, InventorySession
 
 
 class InventorySessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = InventorySession
-        fields = ('id', 'location', 'started_at', 'finished_at', 'created_by', 'result')
-        read_only_fields = ('id', 'started_at', 'finished_at', 'created_by', 'result')
+        fields = (
+            'id', 'location', 'started_at', 'finished_at', 'created_by', 'result',
+            'expected_count', 'scanned_count', 'extra_count',
+        )
+        read_only_fields = (
+            'id', 'started_at', 'finished_at', 'created_by', 'result',
+            'expected_count', 'scanned_count', 'extra_count',
+        )
 
 
 class InventoryScanSerializer(serializers.Serializer):
     equipment_id = serializers.UUIDField()
 
+
+class InventoryDiscrepancySerializer(serializers.ModelSerializer):
+    equipment_name = serializers.CharField(source='equipment.name', read_only=True)
+
+    class Meta:
+        model = InventoryDiscrepancy
+        fields = ('id', 'equipment', 'equipment_name', 'kind')
+
+
+class InventoryDiscrepancyFilterSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=InventoryDiscrepancy.Kind.choices, required=False)
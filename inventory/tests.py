@@ -1,3 +1,80 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
 
-# Create your tests here.
+from equipment.models import Equipment, Location
+from inventory.models import InventoryScan
+
+User = get_user_model()
+
+
+class InventoryTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='keeper', password='pass', role='storekeeper')
+        self.client.force_authenticate(self.user)
+        self.warehouse = Location.objects.create(name='Склад')
+        self.shelf = Location.objects.create(name='Стеллаж', parent=self.warehouse)
+        self.drill = Equipment.objects.create(name='Дрель', location=self.shelf)
+        self.saw = Equipment.objects.create(name='Пила', location=self.warehouse)
+        self.elsewhere = Equipment.objects.create(name='Лестница')
+        response = self.client.post(reverse('inventory-list'), {'location': self.warehouse.id}, format='json')
+        self.session_id = response.data['id']
+        self.assertEqual(response.data['expected_count'], 2)
+
+    def scan(self, equipment_id):
+        return self.client.post(
+            reverse('inventory-scan', args=[self.session_id]), {'equipment_id': str(equipment_id)}, format='json',
+        )
+
+    def test_scans_are_recorded_once(self):
+        self.assertEqual(self.scan(self.drill.id).data['scanned_count'], 1)
+        with self.assertNumQueries(2):
+            response = self.scan(self.drill.id)
+        self.assertEqual(response.data['scanned_count'], 1)
+        self.assertEqual(self.scan(self.elsewhere.id).data['scanned_count'], 2)
+        self.assertEqual(self.scan('00000000-0000-0000-0000-000000000000').status_code, 404)
+        self.assertEqual(InventoryScan.objects.filter(session_id=self.session_id).count(), 2)
+
+        # Stock arriving after the start is not expected by this session.
+        Equipment.objects.create(name='Молоток', location=self.shelf)
+        progress_url = reverse('inventory-progress', args=[self.session_id])
+        with self.assertNumQueries(1):
+            response = self.client.get(progress_url)
+        self.assertEqual(response.data, {
+            'expected_count': 2, 'scanned_count': 2, 'found_count': 1, 'missing_count': 1, 'extra_count': 1,
+        })
+
+        finish_url = reverse('inventory-finish', args=[self.session_id])
+        with self.assertNumQueries(6):
+            response = self.client.post(finish_url)
+        self.assertEqual(response.data, {'scanned_count': 2, 'missing_count': 1, 'extra_count': 1})
+        # Finishing again replaces the discrepancies rather than adding to them.
+        self.client.post(finish_url)
+        url = reverse('inventory-discrepancies', args=[self.session_id])
+        response = self.client.get(url)
+        self.assertEqual(
+            [(item['equipment_name'], item['kind']) for item in response.data['results']],
+            [('Пила', 'missing'), ('Лестница', 'extra')],
+        )
+        response = self.client.get(url, {'kind': 'extra'})
+        self.assertEqual([item['equipment'] for item in response.data['results']], [self.elsewhere.id])
+
+    def test_batch_scans_accept_json_and_ndjson(self):
+        url = reverse('inventory-scan-batch', args=[self.session_id])
+        self.scan(self.drill.id)
+        reads = [str(self.drill.id), str(self.saw.id), str(self.saw.id), '00000000-0000-0000-0000-000000000000', 'мусор']
+        with self.assertNumQueries(2):
+            response = self.client.post(url, reads, format='json')
+        self.assertEqual(response.data, {
+            'received': 5, 'accepted': 1, 'duplicate': 2, 'unknown': 1, 'malformed': 1, 'scanned_count': 2,
+        })
+
+        body = f'{{"equipment_id": "{self.elsewhere.id}"}}\n\n"{self.drill.id}"\n'
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual((response.data['accepted'], response.data['duplicate']), (1, 1))
+        self.assertEqual(self.client.get(reverse('inventory-progress', args=[self.session_id])).data['extra_count'], 1)
+        self.assertEqual(self.client.post(url, 'not json\n', content_type='application/x-ndjson').status_code, 400)
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=100):
+            response = self.client.post(url, f'"{self.drill.id}"\n' * 5, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
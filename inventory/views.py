@@ -1,50 +1,108 @@
+import uuid
+
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
-from equipment.models import Equipment
-from .models import InventorySession
-from .serializers import InventoryScanSerializer, InventorySessionSerializer
+from .models import InventoryScan, InventorySession
+from .serializers import (
+    InventoryDiscrepancyFilterSerializer,
+    InventoryDiscrepancySerializer,
+    InventoryScanSerializer,
+    InventorySessionSerializer,
+)
+from smart_warehouse.pagination import DiscrepancyCursorPagination
+from smart_warehouse.parsers import NDJSONParser
 from users.permissions import IsStorekeeperOrAdmin
 
+SCAN_BATCH_MAX = 10000
+
 
 class InventorySessionViewSet(viewsets.ModelViewSet):
     queryset = InventorySession.objects.select_related('location', 'created_by').all()
     serializer_class = InventorySessionSerializer
     permission_classes = [IsStorekeeperOrAdmin]
+    ndjson_max_items = SCAN_BATCH_MAX
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user, result={'scanned': []})
+        session = serializer.save(created_by=self.request.user)
+        session.freeze_expected()
 
     @action(detail=True, methods=['post'])
     def scan(self, request, pk=None):
         session = self.get_object()
         serializer = InventoryScanSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        scanned = session.result.get('scanned', [])
-        equipment_id = str(serializer.validated_data['equipment_id'])
-        if equipment_id not in scanned:
-            scanned.append(equipment_id)
-            session.result['scanned'] = scanned
-            session.save(update_fields=['result'])
-        return Response({'scanned_count': len(scanned)})
+        found, _, scanned_count = InventoryScan.objects.record(
+            session.id, serializer.validated_data['equipment_id'], request.user.id,
+        )
+        if not found:
+            return Response({'detail': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'scanned_count': scanned_count})
+
+    @action(detail=True, methods=['post'], url_path='scan/batch', parser_classes=[JSONParser, NDJSONParser])
+    def scan_batch(self, request, pk=None):
+        """Record a burst of reads, sent as a JSON array or NDJSON of ids, with one statement."""
+        session = self.get_object()
+        reads = request.data
+        if isinstance(reads, dict):
+            reads = reads.get('equipment_ids')
+        if not isinstance(reads, list):
+            return Response({'detail': 'Expected a list of equipment ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(reads) > SCAN_BATCH_MAX:
+            return Response(
+                {'detail': f'At most {SCAN_BATCH_MAX} reads per batch'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        equipment_ids = set()
+        malformed = 0
+        for read in reads:
+            if isinstance(read, dict):
+                read = read.get('equipment_id')
+            try:
+                equipment_ids.add(uuid.UUID(str(read)))
+            except ValueError:
+                malformed += 1
+        known, accepted, scanned_count = 0, 0, session.scanned_count
+        if equipment_ids:
+            known, accepted, scanned_count = InventoryScan.objects.record_many(
+                session.id, equipment_ids, request.user.id,
+            )
+        unknown = len(equipment_ids) - known
+        return Response({
+            'received': len(reads),
+            'accepted': accepted,
+            'duplicate': len(reads) - malformed - unknown - accepted,
+            'unknown': unknown,
+            'malformed': malformed,
+            'scanned_count': scanned_count,
+        })
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Live counts against the expected set frozen when the session was created."""
+        return Response(self.get_object().progress())
 
     @action(detail=True, methods=['post'])
     def finish(self, request, pk=None):
         session = self.get_object()
-        scanned = set(session.result.get('scanned', []))
-        expected_qs = Equipment.objects.all()
-        if session.location_id:
-            expected_qs = expected_qs.filter(location_id=session.location_id)
-        expected = set(str(item.id) for item in expected_qs)
-        missing = sorted(expected - scanned)
-        extra = sorted(scanned - expected)
-        session.result = {
-            'scanned': sorted(scanned),
-            'missing': missing,
-            'extra': extra,
-        }
+        session.result = session.reconcile()
         session.finished_at = timezone.now()
         session.save(update_fields=['result', 'finished_at'])
         return Response(session.result, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def discrepancies(self, request, pk=None):
+        """Cursor-paginated missing and extra items found by ``finish``; ``?kind=`` narrows to one."""
+        session = self.get_object()
+        params = InventoryDiscrepancyFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = session.discrepancies.select_related('equipment').only('kind', 'equipment__name')
+        if 'kind' in params.validated_data:
+            queryset = queryset.filter(kind=params.validated_data['kind'])
+        paginator = DiscrepancyCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(InventoryDiscrepancySerializer(page, many=True).data)
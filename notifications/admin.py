@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, NotificationEvent
 
 
 @admin.register(Notification)
@@ -8,3 +8,9 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ('title', 'kind', 'user', 'is_read', 'created_at')
     list_filter = ('kind', 'is_read', 'created_at')
     search_fields = ('title', 'message', 'user__username')
+
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    list_display = ('title', 'kind', 'created_at', 'dispatched_at')
+    list_filter = ('kind',)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification events to their recipients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+        parser.add_argument('--batch', type=int, default=100, help='Events delivered per transaction.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when idle.')
+
+    def handle(self, *args, **options):
+        while True:
+            dispatched = dispatch_pending(limit=options['batch'])
+            if dispatched:
+                self.stdout.write(f'Dispatched {dispatched} event(s)')
+            if dispatched < options['batch']:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -17,3 +17,26 @@ class Notification(models.Model):
 
     def __str__(self) -> str:
         return f'{self.get_kind_display()}: {self.title}'
+
+
+class NotificationEvent(models.Model):
+    """Outbox entry: one row per event, fanned out to recipients by ``dispatch_notifications``."""
+
+    kind = models.CharField(max_length=32, choices=Notification.Kind.choices, default=Notification.Kind.INFO)
+    title = models.CharField(max_length=200)
+    message = models.TextField(blank=True)
+    recipient_roles = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(dispatched_at__isnull=True),
+                name='notificationevent_pending_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()}: {self.title}'
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationEvent
+
+STAFF_ROLES = ['admin', 'storekeeper']
+
+
+def publish(events):
+    """Queue ``NotificationEvent`` objects with one INSERT, whatever the number of recipients."""
+    return NotificationEvent.objects.bulk_create(events)
+
+
+def dispatch_pending(limit: int = 100) -> int:
+    """Fan out up to ``limit`` queued events into per-user notifications.
+
+    Events are claimed with ``SKIP LOCKED`` so several dispatchers can run side by side, and each
+    batch of events is delivered and marked dispatched in the same transaction.
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by('id')[:limit]
+        )
+        if not events:
+            return 0
+        roles = {role for event in events for role in event.recipient_roles}
+        recipients = {}
+        for user_id, role in User.objects.filter(role__in=roles, is_active=True).values_list('id', 'role'):
+            recipients.setdefault(role, []).append(user_id)
+        notifications = []
+        for event in events:
+            user_ids = {user_id for role in event.recipient_roles for user_id in recipients.get(role, ())}
+            notifications.extend(
+                Notification(user_id=user_id, kind=event.kind, title=event.title, message=event.message)
+                for user_id in sorted(user_ids)
+            )
+        Notification.objects.bulk_create(notifications, batch_size=1000)
+        NotificationEvent.objects.filter(id__in=[event.id for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
@@ -5,7 +5,6 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from equipment.models import Equipment
-from operations.models import Operation
 from users.permissions import IsStorekeeperOrAdmin
 from .models import Notification
 from .serializers import NotificationSerializer
@@ -31,19 +30,22 @@ class OverdueView(APIView):
     permission_classes = [IsStorekeeperOrAdmin]
 
     def get(self, request):
-        now = timezone.now()
-        overdue_ops = Operation.objects.filter(
-            action_type=Operation.ActionType.ISSUE,
-            due_at__isnull=False,
-            due_at__lt=now,
-            equipment__status=Equipment.Status.ISSUED,
-        ).select_related('equipment', 'target_user')
+        # Served by the partial index over open, dated loans; history is never scanned. The status
+        # check drops loans closed outside the return transition (admin, API edits), whose due date stays.
+        overdue = (
+            Equipment.objects
+            .filter(current_due_at__lt=timezone.now(), status=Equipment.Status.ISSUED)
+            .select_related('current_issue__target_user')
+            .only('id', 'name', 'current_due_at', 'current_issue__target_user__username')
+            .order_by('current_due_at')
+        )
         data = []
-        for op in overdue_ops:
+        for equipment in overdue:
+            target_user = equipment.current_issue.target_user if equipment.current_issue else None
             data.append({
-                'equipment_id': str(op.equipment_id),
-                'equipment_name': op.equipment.name,
-                'target_user': op.target_user.username if op.target_user else '',
-                'due_at': op.due_at.isoformat() if op.due_at else None,
+                'equipment_id': str(equipment.id),
+                'equipment_name': equipment.name,
+                'target_user': target_user.username if target_user else '',
+                'due_at': equipment.current_due_at.isoformat(),
             })
         return Response({'overdue': data}, status=status.HTTP_200_OK)
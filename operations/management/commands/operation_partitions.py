@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from operations import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly operation partitions and archive old ones as compressed NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months of partitions to keep ready.')
+        parser.add_argument('--archive', action='store_true', help='Archive and drop expired partitions.')
+        parser.add_argument('--retention-months', type=int, default=settings.OPERATION_RETENTION_MONTHS)
+        parser.add_argument('--archive-dir', default=settings.OPERATION_ARCHIVE_DIR)
+
+    def handle(self, *args, **options):
+        for name in partitions.ensure_partitions(options['ahead']):
+            self.stdout.write(f'Created {name}')
+        if options['archive']:
+            archived = partitions.archive_partitions(options['retention_months'], options['archive_dir'])
+            for name, rows, path in archived:
+                self.stdout.write(f'Archived {name}: {rows} rows -> {path}')
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0003_equipment_equipment_updated_id_idx'),
+        ('operations', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['timestamp', 'id'], name='operation_timestamp_id_idx'),
+        ),
+    ]
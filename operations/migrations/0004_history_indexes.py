@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0008_current_issue'),
+        ('operations', '0003_operation_operation_timestamp_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['equipment', '-timestamp', '-id'], name='operation_equipment_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='operation_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['target_user', '-timestamp', '-id'], name='operation_target_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+import re
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'operations_operation'
+LEGACY = 'operations_operation_legacy'
+SEQUENCE = 'operations_operation_id_part_seq'
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rename_to_legacy(cursor):
+    """Rename the table aside and return its index and foreign key definitions for recreation."""
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY}')
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s '
+        'AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)',
+        [LEGACY, LEGACY],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [LEGACY],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _restore_constraints(cursor, indexes, foreign_keys):
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    for definition in indexes:
+        cursor.execute(re.sub(rf' ON (ONLY )?(\w+\.)?{LEGACY} ', f' ON {TABLE} ', definition))
+
+
+def partition_operations(apps, schema_editor):
+    """Rebuild operations_operation as a table range-partitioned by month on "timestamp".
+
+    The primary key becomes (id, "timestamp"), as PostgreSQL requires the partition key in every
+    unique constraint. Django's migration state keeps ``id`` as the primary key: ids still come from
+    one sequence and stay unique, and ``Equipment.current_issue`` needs a single-column target.
+    Indexes and foreign keys are recreated from the old table's definitions.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys = _rename_to_legacy(cursor)
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+        # The sequence survives from an earlier unpartition_operations when migrating forward again.
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}')
+        cursor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {LEGACY}")
+
+        cursor.execute(f'SELECT MIN("timestamp"), NOW() FROM {LEGACY}')
+        first, now = cursor.fetchone()
+        month = date((first or now).year, (first or now).month, 1)
+        last = _add_months(date(now.year, now.month, 1), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month.isoformat(), _add_months(month, 1).isoformat()],
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {LEGACY}')
+        cursor.execute(f'DROP TABLE {LEGACY}')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        _restore_constraints(cursor, indexes, foreign_keys)
+
+
+def unpartition_operations(apps, schema_editor):
+    """Fold the partitions back into one plain table keyed on ``id``. Archived months are not restored."""
+    with schema_editor.connection.cursor() as cursor:
+        indexes, foreign_keys = _rename_to_legacy(cursor)
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {LEGACY}')
+        cursor.execute(f'DROP TABLE {LEGACY}')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+        _restore_constraints(cursor, indexes, foreign_keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0009_current_issue_no_constraint'),
+        ('operations', '0004_history_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_operations, unpartition_operations),
+    ]
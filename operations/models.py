@@ -46,5 +46,14 @@ class Operation(models.Model):
     notes = models.TextField(blank=True)
     due_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='operation_timestamp_id_idx'),
+            # Match the (-timestamp, -id) cursor ordering so each filtered timeline is one index range.
+            models.Index(fields=['equipment', '-timestamp', '-id'], name='operation_equipment_ts_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='operation_user_ts_idx'),
+            models.Index(fields=['target_user', '-timestamp', '-id'], name='operation_target_user_ts_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'{self.get_action_type_display()} - {self.equipment_id}'
@@ -0,0 +1,119 @@
+"""Monthly range partitions of ``operations_operation`` and their cold archive.
+
+Each month lives in ``operations_operation_pYYYYMM``; rows outside every month land in
+``operations_operation_default`` until their partition is created. Old months are exported to
+gzip-compressed NDJSON and dropped, so queries on recent history only touch recent partitions.
+"""
+import gzip
+import os
+import re
+from datetime import date
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from reports.history import REPLAY_OVERLAP
+from reports.models import StateSnapshot
+
+TABLE = 'operations_operation'
+DEFAULT_PARTITION = f'{TABLE}_default'
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def attached_months(cursor) -> list:
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = %s',
+        [TABLE],
+    )
+    months = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_RE.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def create_partition(cursor, month: date) -> str:
+    """Create and attach the partition for ``month``, moving any of its rows out of the default partition."""
+    name = partition_name(month)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        bounds,
+    )
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+    return name
+
+
+def ensure_partitions(months_ahead: int = 3, today=None) -> list:
+    """Make sure partitions exist from the current month through ``months_ahead`` months ahead."""
+    current = month_start(today or timezone.localdate())
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = set(attached_months(cursor))
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                created.append(create_partition(cursor, month))
+    return created
+
+
+def archive_partitions(retention_months: int, directory, today=None) -> list:
+    """Export months older than ``retention_months`` to ``<directory>/<partition>.ndjson.gz`` and drop them.
+
+    A month still holding the open issue of an item on loan is kept, so ``Equipment.current_issue``
+    never points at an archived row, and so is every month the oldest state snapshot replays from.
+    Returns ``(partition, rows, path)`` for each archived month.
+    """
+    cutoff = add_months(month_start(today or timezone.localdate()), -retention_months)
+    oldest_snapshot = StateSnapshot.objects.order_by('taken_at').values_list('taken_at', flat=True).first()
+    if oldest_snapshot is not None:
+        cutoff = min(cutoff, month_start(oldest_snapshot - REPLAY_OVERLAP))
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    archived = []
+    with connection.cursor() as cursor:
+        months = [month for month in attached_months(cursor) if month < cutoff]
+    for month in months:
+        name = partition_name(month)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT EXISTS (SELECT 1 FROM equipment_equipment e JOIN {name} o ON o.id = e.current_issue_id)'
+                )
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(f'LOCK TABLE {name} IN SHARE MODE')
+            path = directory / f'{name}.ndjson.gz'
+            tmp_path = path.with_suffix('.tmp')
+            rows = 0
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive, connection.chunked_cursor() as rows_cursor:
+                rows_cursor.execute(f'SELECT row_to_json(o)::text FROM {name} o ORDER BY o.id')
+                while batch := rows_cursor.fetchmany(2000):
+                    archive.writelines(f'{line}\n' for (line,) in batch)
+                    rows += len(batch)
+            os.replace(tmp_path, path)
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+        archived.append((name, rows, path))
+    return archived
@@ -22,6 +22,23 @@ class OperationSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'timestamp', 'user')
 
 
+class OperationFilterSerializer(serializers.Serializer):
+    equipment = serializers.UUIDField(required=False)
+    user = serializers.IntegerField(required=False)
+    target_user = serializers.IntegerField(required=False)
+    action_type = serializers.ChoiceField(choices=Operation.ActionType.choices, required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+
+class ScanBatchSerializer(serializers.Serializer):
+    codes = serializers.ListField(
+        child=serializers.CharField(allow_blank=True),
+        min_length=1,
+        max_length=5000,
+    )
+
+
 class IssueSerializer(serializers.Serializer):
     equipment_id = serializers.UUIDField()
     target_user_id = serializers.IntegerField()
@@ -33,3 +50,14 @@ class ReturnSerializer(serializers.Serializer):
     equipment_id = serializers.UUIDField()
     condition = serializers.ChoiceField(choices=Operation.Condition.choices)
     notes = serializers.CharField(required=False, allow_blank=True)
+
+
+class IssueBatchSerializer(serializers.Serializer):
+    equipment_ids = serializers.ListField(child=serializers.UUIDField(), min_length=1, max_length=200)
+    target_user_id = serializers.IntegerField()
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    due_at = serializers.DateTimeField(required=False, allow_null=True, default=None)
+
+
+class ReturnBatchSerializer(serializers.Serializer):
+    items = ReturnSerializer(many=True, min_length=1, max_length=200)
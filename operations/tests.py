@@ -1,9 +1,22 @@
+import gzip
+import json
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient, APITestCase
 
+from equipment import scan_cache
 from equipment.models import Equipment, EquipmentCategory, Location
+from notifications.outbox import dispatch_pending
+from operations import partitions, transitions
 from operations.models import Operation
+from operations.transitions import TransitionConflict
+from reports.models import StateSnapshot
 
 User = get_user_model()
 
@@ -44,3 +57,177 @@ class IssueReturnTests(APITestCase):
         self.equipment.refresh_from_db()
         self.assertEqual(self.equipment.status, Equipment.Status.IN_STOCK)
         self.assertIsNone(self.equipment.responsible_user)
+
+    def test_issue_conflicts_are_reported(self):
+        issue_url = reverse('operations-issue')
+        payload = {'equipment_id': str(self.equipment.id), 'target_user_id': self.worker.id}
+        # Read the row as a concurrent request would have, before the first issue lands.
+        stale = Equipment.objects.get(id=self.equipment.id)
+        self.assertEqual(self.client.post(issue_url, payload, format='json').status_code, 201)
+        self.assertEqual(self.client.post(issue_url, payload, format='json').status_code, 409)
+        with self.assertRaises(TransitionConflict):
+            transitions.ISSUE.apply(stale, Equipment.Status.ISSUED, responsible_user=self.admin)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.responsible_user, self.worker)
+        self.assertEqual(Operation.objects.filter(action_type=Operation.ActionType.ISSUE).count(), 1)
+
+    def test_scan_is_cached_until_equipment_changes(self):
+        scan_url = reverse('scan')
+        payload = {'equipment_id': str(self.equipment.id)}
+        self.assertEqual(self.client.post(scan_url, payload, format='json').data['status'], Equipment.Status.IN_STOCK)
+        with self.assertNumQueries(0):
+            response = self.client.post(scan_url, payload, format='json')
+        self.assertEqual(response.data['location'], self.location.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('operations-issue'), {
+                'equipment_id': str(self.equipment.id),
+                'target_user_id': self.worker.id,
+            }, format='json')
+        self.assertEqual(self.client.post(scan_url, payload, format='json').data['status'], Equipment.Status.ISSUED)
+        self.assertEqual(self.client.post(scan_url, {'qr_data': 'not-a-uuid'}, format='json').status_code, 404)
+
+    def test_scan_cache_drops_rows_invalidated_while_loading(self):
+        load = Equipment.objects.filter
+
+        def load_then_change(*args, **kwargs):
+            rows = list(load(*args, **kwargs).values_list('id', 'name', 'status', 'location_id'))
+            scan_cache._drop([self.equipment.id])
+            return mock.Mock(values_list=lambda *fields: rows)
+
+        cache.clear()
+        with mock.patch.object(Equipment.objects, 'filter', side_effect=load_then_change):
+            self.assertEqual(scan_cache.lookup(self.equipment.id)['name'], 'Дрель')
+        self.assertIsNone(cache.get(scan_cache._key(self.equipment.id)))
+        with self.assertNumQueries(1):
+            scan_cache.lookup(self.equipment.id)
+
+    def test_scan_batch_sorts_codes(self):
+        other = Equipment.objects.create(name='Пила', category=self.category)
+        missing = '00000000-0000-0000-0000-000000000000'
+        codes = [str(self.equipment.id), str(other.id).upper(), str(self.equipment.id), missing, 'мусор', 'мусор']
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('scan-batch'), {'codes': codes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['found']], [str(self.equipment.id), str(other.id)])
+        self.assertEqual(response.data['unknown'], [missing])
+        self.assertEqual(response.data['malformed'], ['мусор'])
+        self.assertEqual(response.data['duplicates'], 2)
+
+    def test_batch_issue_and_return(self):
+        drill = self.equipment
+        saw = Equipment.objects.create(name='Пила', location=self.location)
+        broken = Equipment.objects.create(name='Шуруповёрт', status=Equipment.Status.IN_REPAIR)
+        missing_id = '00000000-0000-0000-0000-000000000000'
+        response = self.client.post(reverse('operations-issue-batch'), {
+            'equipment_ids': [str(drill.id), str(saw.id), str(broken.id), missing_id],
+            'target_user_id': self.worker.id,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['result'] for item in response.data['results']],
+            ['issued', 'issued', 'conflict', 'not_found'],
+        )
+        self.assertEqual(
+            set(Equipment.objects.filter(responsible_user=self.worker).values_list('name', flat=True)),
+            {'Дрель', 'Пила'},
+        )
+
+        response = self.client.post(reverse('operations-return-batch'), {'items': [
+            {'equipment_id': str(drill.id), 'condition': Operation.Condition.OK},
+            {'equipment_id': str(saw.id), 'condition': Operation.Condition.NEED_REPAIR},
+            {'equipment_id': str(broken.id), 'condition': Operation.Condition.OK},
+        ]}, format='json')
+        self.assertEqual(
+            [item['result'] for item in response.data['results']],
+            ['returned', 'returned', 'conflict'],
+        )
+        drill.refresh_from_db()
+        saw.refresh_from_db()
+        self.assertEqual((drill.status, drill.responsible_user), (Equipment.Status.IN_STOCK, None))
+        self.assertEqual(saw.status, Equipment.Status.IN_REPAIR)
+        self.assertEqual(Operation.objects.filter(action_type=Operation.ActionType.RETURN).count(), 2)
+        self.assertEqual(self.admin.notifications.count(), 0)
+        self.assertEqual(dispatch_pending(), 1)
+        self.assertEqual(self.admin.notifications.get().title, 'Проблема с оборудованием: Пила')
+        self.assertFalse(self.worker.notifications.exists())
+        self.assertEqual(dispatch_pending(), 0)
+
+    def test_overdue_lists_only_open_loans(self):
+        issue_url = reverse('operations-issue')
+        return_url = reverse('operations-return')
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+        payload = {'equipment_id': str(self.equipment.id), 'target_user_id': self.worker.id, 'due_at': past}
+        self.client.post(issue_url, payload, format='json')
+        self.client.post(return_url, {
+            'equipment_id': str(self.equipment.id), 'condition': Operation.Condition.OK,
+        }, format='json')
+        self.equipment.refresh_from_db()
+        self.assertIsNone(self.equipment.current_issue)
+        self.assertEqual(self.client.get(reverse('notifications-overdue')).data['overdue'], [])
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self.client.post(reverse('operations-issue-batch'), {
+            'equipment_ids': [str(self.equipment.id)], 'target_user_id': self.admin.id, 'due_at': past,
+        }, format='json')
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.current_issue_id, response.data['results'][0]['operation_id'])
+        overdue = self.client.get(reverse('notifications-overdue')).data['overdue']
+        self.assertEqual([(item['equipment_name'], item['target_user']) for item in overdue], [('Дрель', 'admin')])
+        saw = Equipment.objects.create(name='Пила')
+        self.client.post(issue_url, {
+            'equipment_id': str(saw.id), 'target_user_id': self.worker.id, 'due_at': future,
+        }, format='json')
+        self.assertEqual(len(self.client.get(reverse('notifications-overdue')).data['overdue']), 1)
+        # A status edited by hand closes the loan for the overdue list too.
+        self.client.patch(reverse('equipment-detail', kwargs={'pk': self.equipment.id}), {
+            'status': Equipment.Status.IN_STOCK,
+        }, format='json')
+        self.assertEqual(self.client.get(reverse('notifications-overdue')).data['overdue'], [])
+
+    def test_operation_filters_and_equipment_history(self):
+        saw = Equipment.objects.create(name='Пила')
+        for equipment in (self.equipment, saw):
+            self.client.post(reverse('operations-issue'), {
+                'equipment_id': str(equipment.id), 'target_user_id': self.worker.id,
+            }, format='json')
+        self.client.post(reverse('operations-return'), {
+            'equipment_id': str(self.equipment.id), 'condition': Operation.Condition.OK,
+        }, format='json')
+        url = reverse('operations-list')
+        response = self.client.get(url, {'equipment': str(self.equipment.id)})
+        self.assertEqual([item['action_type'] for item in response.data['results']], ['return', 'issue'])
+        response = self.client.get(url, {'action_type': 'issue', 'target_user': self.worker.id})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+
+        history_url = reverse('equipment-history', kwargs={'pk': self.equipment.id})
+        with self.assertNumQueries(1):
+            response = self.client.get(history_url, {'page_size': 1})
+        self.assertEqual(response.data['results'][0]['action_type'], 'return')
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['action_type'], 'issue')
+        missing = reverse('equipment-history', kwargs={'pk': '00000000-0000-0000-0000-000000000000'})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_partitions_are_created_and_archived(self):
+        old = Operation.objects.create(
+            equipment=self.equipment, action_type=Operation.ActionType.MOVE, user=self.admin,
+        )
+        # Far enough back that no partition exists yet: the row waits in the default partition.
+        Operation.objects.filter(id=old.id).update(timestamp=timezone.now().replace(year=2001, month=3))
+        recent = Operation.objects.create(
+            equipment=self.equipment, action_type=Operation.ActionType.MOVE, user=self.admin,
+        )
+        self.assertEqual(partitions.ensure_partitions(0, today=date(2001, 3, 10)), ['operations_operation_p200103'])
+        self.assertEqual(partitions.ensure_partitions(0, today=date(2001, 3, 10)), [])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # A snapshot replays operations from its month onwards, so that month must stay.
+        snapshot = StateSnapshot.objects.create(taken_at=timezone.now().replace(year=2001, month=3, day=20))
+        self.assertEqual(partitions.archive_partitions(12, directory.name), [])
+        StateSnapshot.objects.filter(pk=snapshot.pk).update(taken_at=timezone.now())
+        archived = partitions.archive_partitions(12, directory.name)
+        self.assertIn(('operations_operation_p200103', 1), [(name, rows) for name, rows, _ in archived])
+        with gzip.open(f'{directory.name}/operations_operation_p200103.ndjson.gz', 'rt') as archive:
+            self.assertEqual([json.loads(line)['id'] for line in archive], [old.id])
+        self.assertEqual(list(Operation.objects.values_list('id', flat=True)), [recent.id])
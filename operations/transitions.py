@@ -0,0 +1,56 @@
+"""Equipment state transitions applied as compare-and-set updates.
+
+A transition is computed from a plain (unlocked) read of the item and written with a single
+``UPDATE ... WHERE id = %s AND status = %s AND responsible_user_id = %s``. If another request changed
+the row in between, the update matches nothing and ``TransitionConflict`` is raised instead of
+waiting on a row lock.
+"""
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from equipment.models import Equipment
+from equipment.signals import equipment_changed
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Equipment state changed, reload and try again.'
+    default_code = 'conflict'
+
+
+class Transition:
+    def __init__(self, name, sources, targets):
+        self.name = name
+        self.sources = frozenset(sources)
+        self.targets = frozenset(targets)
+
+    def allows(self, current_status) -> bool:
+        return current_status in self.sources
+
+    def apply(self, equipment: Equipment, target: str, **changes) -> None:
+        """Move ``equipment`` (as read) to ``target``, updating ``changes`` in the same statement."""
+        if target not in self.targets:
+            raise ValueError(f'{self.name} cannot end in {target}')
+        if not self.allows(equipment.status):
+            raise TransitionConflict(f'Cannot {self.name}: equipment is {equipment.get_status_display()}.')
+        changes = {'status': target, 'updated_at': timezone.now(), **changes}
+        # Guarding on the holder too catches an item returned and re-issued since it was read.
+        updated = Equipment.objects.filter(
+            id=equipment.id,
+            status=equipment.status,
+            responsible_user_id=equipment.responsible_user_id,
+        ).update(**changes)
+        if not updated:
+            raise TransitionConflict()
+        for name, value in changes.items():
+            setattr(equipment, name, value)
+        equipment_changed.send(sender=Equipment, ids=[equipment.id])
+
+
+ISSUE = Transition('issue', sources={Equipment.Status.IN_STOCK}, targets={Equipment.Status.ISSUED})
+RETURN = Transition(
+    'return',
+    sources={Equipment.Status.ISSUED},
+    targets={Equipment.Status.IN_STOCK, Equipment.Status.IN_REPAIR, Equipment.Status.WRITTEN_OFF},
+)
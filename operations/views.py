@@ -1,22 +1,94 @@
+import uuid
+
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 from rest_framework import permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from equipment import scan_cache
 from equipment.models import Equipment
-from notifications.models import Notification
+from equipment.signals import equipment_changed
+from notifications import outbox
+from notifications.models import Notification, NotificationEvent
+from . import transitions
 from .models import Operation
-from .serializers import IssueSerializer, OperationSerializer, ReturnSerializer
+from .serializers import (
+    IssueBatchSerializer,
+    IssueSerializer,
+    OperationFilterSerializer,
+    OperationSerializer,
+    ReturnBatchSerializer,
+    ReturnSerializer,
+    ScanBatchSerializer,
+)
+from smart_warehouse.pagination import OperationCursorPagination
 from users.permissions import IsObserverOrAbove, IsStorekeeperOrAdmin
 
 User = get_user_model()
 
+TRANSITION_FIELDS = ('id', 'name', 'status', 'location_id', 'responsible_user_id')
+
 
 class OperationViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Operation.objects.select_related('equipment', 'user', 'target_user').all()
+    queryset = Operation.objects.all()
     serializer_class = OperationSerializer
     permission_classes = [IsObserverOrAbove]
+    pagination_class = OperationCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        params = OperationFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        for name in ('equipment', 'user', 'target_user', 'action_type'):
+            if name in filters:
+                queryset = queryset.filter(**{name: filters[name]})
+        if 'start' in filters:
+            queryset = queryset.filter(timestamp__gte=filters['start'])
+        if 'end' in filters:
+            queryset = queryset.filter(timestamp__lte=filters['end'])
+        return queryset
+
+
+def _return_status(condition):
+    if condition == Operation.Condition.NEED_REPAIR:
+        return Equipment.Status.IN_REPAIR
+    if condition == Operation.Condition.DAMAGED:
+        return Equipment.Status.WRITTEN_OFF
+    return Equipment.Status.IN_STOCK
+
+
+def _notify_staff(returns):
+    """Queue one outbox event per ``(equipment, condition)`` return that needs attention."""
+    events = []
+    for equipment, condition in returns:
+        if condition not in {Operation.Condition.NEED_REPAIR, Operation.Condition.DAMAGED}:
+            continue
+        repair = condition == Operation.Condition.NEED_REPAIR
+        events.append(NotificationEvent(
+            kind=Notification.Kind.REPAIR if repair else Notification.Kind.INFO,
+            title=f'Проблема с оборудованием: {equipment.name}',
+            message='Требуется ремонт' if repair else 'Оборудование повреждено',
+            recipient_roles=outbox.STAFF_ROLES,
+        ))
+    if events:
+        outbox.publish(events)
+
+
+def _lock_equipment(ids):
+    """Lock the rows in one statement, in primary-key order so overlapping batches cannot deadlock."""
+    return {
+        equipment.id: equipment
+        for equipment in Equipment.objects.select_for_update()
+        .filter(id__in=ids)
+        .order_by('id')
+        .only(*TRANSITION_FIELDS)
+    }
 
 
 class ScanView(APIView):
@@ -26,89 +98,220 @@ class ScanView(APIView):
         equipment_id = request.data.get('equipment_id') or request.data.get('qr_data')
         if not equipment_id:
             return Response({'detail': 'equipment_id or qr_data required'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            equipment = Equipment.objects.get(id=equipment_id)
-        except Equipment.DoesNotExist:
+        projection = scan_cache.lookup(equipment_id)
+        if projection is None:
             return Response({'detail': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(projection)
+
+
+class ScanBatchView(APIView):
+    """Resolve a burst of scanned codes at once; repeated codes are reported once."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = ScanBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        codes = serializer.validated_data['codes']
+        equipment_ids = []
+        malformed = []
+        seen = set()
+        for code in codes:
+            try:
+                equipment_id = uuid.UUID(code)
+            except ValueError:
+                if code not in seen:
+                    malformed.append(code)
+                    seen.add(code)
+                continue
+            if equipment_id not in seen:
+                equipment_ids.append(equipment_id)
+                seen.add(equipment_id)
+        found = scan_cache.lookup_many(equipment_ids)
         return Response({
-            'id': str(equipment.id),
-            'name': equipment.name,
-            'status': equipment.status,
-            'location': equipment.location_id,
+            'found': [found[equipment_id] for equipment_id in equipment_ids if equipment_id in found],
+            'unknown': [str(equipment_id) for equipment_id in equipment_ids if equipment_id not in found],
+            'malformed': malformed,
+            'duplicates': len(codes) - len(seen),
         })
 
 
 class IssueView(APIView):
     permission_classes = [IsStorekeeperOrAdmin]
 
-    @transaction.atomic
     def post(self, request):
         serializer = IssueSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         try:
-            equipment = Equipment.objects.select_for_update().get(id=serializer.validated_data['equipment_id'])
+            equipment = Equipment.objects.only(*TRANSITION_FIELDS).get(id=serializer.validated_data['equipment_id'])
         except Equipment.DoesNotExist:
             return Response({'detail': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
         try:
             target_user = User.objects.get(id=serializer.validated_data['target_user_id'])
         except User.DoesNotExist:
             return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
-        equipment.status = Equipment.Status.ISSUED
-        equipment.responsible_user = target_user
-        equipment.save(update_fields=['status', 'responsible_user', 'updated_at'])
-        operation = Operation.objects.create(
-            equipment=equipment,
-            action_type=Operation.ActionType.ISSUE,
-            user=request.user,
-            target_user=target_user,
-            location_from=equipment.location,
-            notes=serializer.validated_data.get('notes', ''),
-            due_at=serializer.validated_data.get('due_at'),
-        )
+        with transaction.atomic():
+            # The operation is inserted first so the transition can point the item at it;
+            # a conflict rolls both back.
+            operation = Operation.objects.create(
+                equipment=equipment,
+                action_type=Operation.ActionType.ISSUE,
+                user=request.user,
+                target_user=target_user,
+                location_from_id=equipment.location_id,
+                notes=serializer.validated_data.get('notes', ''),
+                due_at=serializer.validated_data.get('due_at'),
+            )
+            transitions.ISSUE.apply(
+                equipment,
+                Equipment.Status.ISSUED,
+                responsible_user=target_user,
+                current_issue=operation,
+                current_due_at=operation.due_at,
+            )
         return Response(OperationSerializer(operation).data, status=status.HTTP_201_CREATED)
 
 
 class ReturnView(APIView):
     permission_classes = [IsStorekeeperOrAdmin]
 
-    @transaction.atomic
     def post(self, request):
         serializer = ReturnSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         try:
-            equipment = Equipment.objects.select_for_update().get(id=serializer.validated_data['equipment_id'])
+            equipment = Equipment.objects.only(*TRANSITION_FIELDS).get(id=serializer.validated_data['equipment_id'])
         except Equipment.DoesNotExist:
             return Response({'detail': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
         condition = serializer.validated_data['condition']
-        if condition == Operation.Condition.NEED_REPAIR:
-            new_status = Equipment.Status.IN_REPAIR
-        elif condition == Operation.Condition.DAMAGED:
-            new_status = Equipment.Status.WRITTEN_OFF
-        else:
-            new_status = Equipment.Status.IN_STOCK
-        equipment.status = new_status
-        equipment.save(update_fields=['status', 'updated_at'])
-        operation = Operation.objects.create(
-            equipment=equipment,
-            action_type=Operation.ActionType.RETURN,
-            user=request.user,
-            target_user=equipment.responsible_user,
-            location_to=equipment.location,
-            condition=condition,
-            notes=serializer.validated_data.get('notes', ''),
-        )
-        if condition in {Operation.Condition.NEED_REPAIR, Operation.Condition.DAMAGED}:
-            kind = Notification.Kind.REPAIR if condition == Operation.Condition.NEED_REPAIR else Notification.Kind.INFO
-            title = f'Проблема с оборудованием: {equipment.name}'
-            message = 'Требуется ремонт' if condition == Operation.Condition.NEED_REPAIR else 'Оборудование повреждено'
-            for admin_user in User.objects.filter(role__in=['admin', 'storekeeper']):
-                Notification.objects.create(
-                    user=admin_user,
-                    kind=kind,
-                    title=title,
-                    message=message,
-                )
-        if new_status != Equipment.Status.ISSUED:
-            equipment.responsible_user = None
-            equipment.save(update_fields=['responsible_user'])
+        holder_id = equipment.responsible_user_id
+        with transaction.atomic():
+            transitions.RETURN.apply(
+                equipment, _return_status(condition), responsible_user=None, current_issue=None, current_due_at=None,
+            )
+            operation = Operation.objects.create(
+                equipment=equipment,
+                action_type=Operation.ActionType.RETURN,
+                user=request.user,
+                target_user_id=holder_id,
+                location_to_id=equipment.location_id,
+                condition=condition,
+                notes=serializer.validated_data.get('notes', ''),
+            )
+            _notify_staff([(equipment, condition)])
         return Response(OperationSerializer(operation).data, status=status.HTTP_201_CREATED)
+
+
+class IssueBatchView(APIView):
+    """Issue several items to one user in a single transaction, with a result per item.
+
+    Only items in stock are issued; others are reported as ``conflict`` and left unchanged.
+    """
+
+    permission_classes = [IsStorekeeperOrAdmin]
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = IssueBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            target_user = User.objects.get(id=data['target_user_id'])
+        except User.DoesNotExist:
+            return Response({'detail': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        ids = list(dict.fromkeys(data['equipment_ids']))
+        locked = _lock_equipment(ids)
+        results = {}
+        operations = []
+        for equipment_id in ids:
+            equipment = locked.get(equipment_id)
+            if equipment is None:
+                results[equipment_id] = {'equipment_id': equipment_id, 'result': 'not_found'}
+            elif not transitions.ISSUE.allows(equipment.status):
+                results[equipment_id] = {'equipment_id': equipment_id, 'result': 'conflict', 'status': equipment.status}
+            else:
+                operations.append(Operation(
+                    equipment_id=equipment_id,
+                    action_type=Operation.ActionType.ISSUE,
+                    user=request.user,
+                    target_user=target_user,
+                    location_from_id=equipment.location_id,
+                    notes=data['notes'],
+                    due_at=data['due_at'],
+                ))
+        if operations:
+            issued_ids = [operation.equipment_id for operation in operations]
+            for operation in Operation.objects.bulk_create(operations):
+                results[operation.equipment_id] = {
+                    'equipment_id': operation.equipment_id,
+                    'result': 'issued',
+                    'operation_id': operation.id,
+                }
+            new_issue = Operation.objects.filter(
+                id__in=[operation.id for operation in operations], equipment=OuterRef('pk'),
+            )
+            Equipment.objects.filter(id__in=issued_ids).update(
+                status=Equipment.Status.ISSUED,
+                responsible_user=target_user,
+                current_issue=Subquery(new_issue.values('id')[:1]),
+                current_due_at=data['due_at'],
+                updated_at=timezone.now(),
+            )
+            equipment_changed.send(sender=Equipment, ids=issued_ids)
+        return Response({'results': [results[equipment_id] for equipment_id in ids]})
+
+
+class ReturnBatchView(APIView):
+    """Return several items in a single transaction, with a result per item.
+
+    Only issued items are returned; others are reported as ``conflict`` and left unchanged.
+    """
+
+    permission_classes = [IsStorekeeperOrAdmin]
+
+    @transaction.atomic
+    def post(self, request):
+        serializer = ReturnBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = {}
+        for item in serializer.validated_data['items']:
+            items.setdefault(item['equipment_id'], item)
+        locked = _lock_equipment(list(items))
+        results = {}
+        operations = []
+        by_status = {}
+        returned = []
+        for equipment_id, item in items.items():
+            equipment = locked.get(equipment_id)
+            if equipment is None:
+                results[equipment_id] = {'equipment_id': equipment_id, 'result': 'not_found'}
+                continue
+            if not transitions.RETURN.allows(equipment.status):
+                results[equipment_id] = {'equipment_id': equipment_id, 'result': 'conflict', 'status': equipment.status}
+                continue
+            condition = item['condition']
+            by_status.setdefault(_return_status(condition), []).append(equipment_id)
+            operations.append(Operation(
+                equipment_id=equipment_id,
+                action_type=Operation.ActionType.RETURN,
+                user=request.user,
+                target_user_id=equipment.responsible_user_id,
+                location_to_id=equipment.location_id,
+                condition=condition,
+                notes=item.get('notes', ''),
+            ))
+            returned.append((equipment, condition))
+        now = timezone.now()
+        for new_status, equipment_ids in by_status.items():
+            Equipment.objects.filter(id__in=equipment_ids).update(
+                status=new_status, responsible_user=None, current_issue=None, current_due_at=None, updated_at=now,
+            )
+        for operation in Operation.objects.bulk_create(operations):
+            results[operation.equipment_id] = {
+                'equipment_id': operation.equipment_id,
+                'result': 'returned',
+                'operation_id': operation.id,
+            }
+        _notify_staff(returned)
+        if operations:
+            equipment_changed.send(sender=Equipment, ids=[operation.equipment_id for operation in operations])
+        return Response({'results': [results[equipment_id] for equipment_id in items]})
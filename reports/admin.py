@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import StateSnapshot
+
+
+@admin.register(StateSnapshot)
+class StateSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('taken_at', 'item_count')
+    readonly_fields = ('taken_at', 'item_count')
@@ -0,0 +1,130 @@
+"""Point-in-time equipment state: the nearest earlier snapshot plus a replay of later operations.
+
+Only operations between the snapshot and the requested moment are read, and that timestamp range
+maps onto a few monthly partitions of the operations table, so the cost follows the gap rather
+than the length of history. Moments before the oldest snapshot cannot be rebuilt, as their
+operations may already be archived.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+
+from equipment.models import Equipment
+from operations.models import Operation
+from .models import SnapshotEntry, StateSnapshot
+
+RETURN_STATUSES = {
+    Operation.Condition.OK: Equipment.Status.IN_STOCK,
+    Operation.Condition.NEED_REPAIR: Equipment.Status.IN_REPAIR,
+    Operation.Condition.DAMAGED: Equipment.Status.WRITTEN_OFF,
+}
+# Timestamps are set before the insert commits, so an operation stamped just before a snapshot can
+# land after the copy. Replay starts this much earlier; every action sets absolute values, so
+# operations already reflected in the snapshot are harmless to apply again.
+REPLAY_OVERLAP = timedelta(minutes=5)
+
+
+class SnapshotNotFound(NotFound):
+    default_detail = 'No snapshot was taken at or before this moment.'
+
+
+def take_snapshot() -> StateSnapshot:
+    """Copy the current state of every item into a new snapshot with one INSERT ... SELECT."""
+    with transaction.atomic():
+        snapshot = StateSnapshot.objects.create(taken_at=timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SnapshotEntry._meta.db_table} '
+                '(snapshot_id, equipment_id, status, location_id, responsible_user_id) '
+                f'SELECT %s, id, status, location_id, responsible_user_id FROM {Equipment._meta.db_table} '
+                'WHERE created_at <= %s',
+                [snapshot.id, snapshot.taken_at],
+            )
+            snapshot.item_count = cursor.rowcount
+        snapshot.save(update_fields=['item_count'])
+    return snapshot
+
+
+def prune_snapshots(keep_days: int, today=None) -> int:
+    """Delete snapshots older than ``keep_days``, keeping the first snapshot of every month."""
+    cutoff = (today or timezone.now()) - timedelta(days=keep_days)
+    old = StateSnapshot.objects.filter(taken_at__lt=cutoff)
+    monthly = old.values('taken_at__year', 'taken_at__month').annotate(first=Min('taken_at')).values('first')
+    _, deleted = old.exclude(taken_at__in=monthly).delete()
+    return deleted.get(StateSnapshot._meta.label, 0)
+
+
+def _apply(state, operation):
+    action = operation.action_type
+    if action == Operation.ActionType.ISSUE:
+        state['status'] = Equipment.Status.ISSUED
+        state['responsible_user_id'] = operation.target_user_id
+    elif action == Operation.ActionType.RETURN:
+        state['status'] = RETURN_STATUSES.get(operation.condition, Equipment.Status.IN_STOCK)
+        state['responsible_user_id'] = None
+    elif action == Operation.ActionType.MOVE:
+        state['location_id'] = operation.location_to_id
+    elif action == Operation.ActionType.REPAIR:
+        state['status'] = Equipment.Status.IN_REPAIR
+    elif action == Operation.ActionType.WRITE_OFF:
+        state['status'] = Equipment.Status.WRITTEN_OFF
+
+
+def state_as_of(moment, location_ids=None):
+    """Return ``(snapshot, replayed, {equipment_id: state})`` for the warehouse at ``moment``.
+
+    Raises ``SnapshotNotFound`` when no snapshot was taken at or before ``moment``.
+    ``state`` holds ``status``, ``location_id`` and ``responsible_user_id``. With ``location_ids``
+    only items located there at ``moment`` are returned. Items created after the snapshot start
+    in stock at the location they were first moved from, or at their current location if they
+    never moved. Edits made outside operations (admin, imports) show up from the next snapshot.
+    """
+    snapshot = StateSnapshot.objects.filter(taken_at__lte=moment).order_by('-taken_at').first()
+    if snapshot is None:
+        raise SnapshotNotFound()
+    since = snapshot.taken_at - REPLAY_OVERLAP
+    operations = Operation.objects.filter(timestamp__gt=since, timestamp__lte=moment)
+    new_items = Equipment.objects.filter(created_at__gt=since, created_at__lte=moment).exclude(
+        id__in=snapshot.entries.values('equipment_id'),
+    )
+    touched = operations.values('equipment_id')
+
+    states = {}
+    entries = snapshot.entries.all()
+    if location_ids is not None:
+        # Items that moved in during the gap are picked up through their operations.
+        entries = entries.filter(Q(location_id__in=location_ids) | Q(equipment_id__in=touched))
+    for equipment_id, item_status, location_id, user_id in entries.values_list(
+        'equipment_id', 'status', 'location_id', 'responsible_user_id',
+    ):
+        states[equipment_id] = {'status': item_status, 'location_id': location_id, 'responsible_user_id': user_id}
+
+    first_moves = dict(
+        Operation.objects.filter(equipment__in=new_items, action_type=Operation.ActionType.MOVE)
+        .order_by('equipment_id', 'timestamp', 'id')
+        .distinct('equipment_id')
+        .values_list('equipment_id', 'location_from_id')
+    )
+    for equipment_id, location_id in new_items.values_list('id', 'location_id'):
+        states[equipment_id] = {
+            'status': Equipment.Status.IN_STOCK,
+            'location_id': first_moves.get(equipment_id, location_id),
+            'responsible_user_id': None,
+        }
+
+    replayed = 0
+    for operation in operations.order_by('timestamp', 'id').only(
+        'equipment_id', 'action_type', 'condition', 'target_user_id', 'location_to_id',
+    ).iterator(chunk_size=2000):
+        state = states.get(operation.equipment_id)
+        if state is not None:
+            _apply(state, operation)
+            replayed += 1
+
+    if location_ids is not None:
+        location_ids = set(location_ids)
+        states = {key: state for key, state in states.items() if state['location_id'] in location_ids}
+    return snapshot, replayed, states
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from reports import history
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the current equipment state for point-in-time reports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune-after-days', type=int, default=None,
+            help='Delete older snapshots, keeping the first one of each month.',
+        )
+
+    def handle(self, *args, **options):
+        snapshot = history.take_snapshot()
+        self.stdout.write(f'{snapshot}: {snapshot.item_count} items')
+        if options['prune_after_days'] is not None:
+            deleted = history.prune_snapshots(options['prune_after_days'])
+            self.stdout.write(f'Pruned {deleted} snapshots')
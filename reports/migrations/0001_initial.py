@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SnapshotEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_id', models.UUIDField()),
+                ('status', models.CharField(choices=[('in_stock', 'На складе'), ('issued', 'Выдано'), ('in_repair', 'В ремонте'), ('written_off', 'Списано')], max_length=32)),
+                ('location_id', models.BigIntegerField(null=True)),
+                ('responsible_user_id', models.BigIntegerField(null=True)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='reports.statesnapshot')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['snapshot', 'location_id'], name='snapshotentry_location_idx')],
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'equipment_id'), name='snapshotentry_unique_item')],
+            },
+        ),
+    ]
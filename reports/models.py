@@ -1,3 +1,33 @@
 from django.db import models
 
-# Create your models here.
+from equipment.models import Equipment
+
+
+class StateSnapshot(models.Model):
+    """Equipment state (status, location, holder) captured at ``taken_at`` by ``take_snapshot``."""
+
+    taken_at = models.DateTimeField(unique=True)
+    item_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'Snapshot {self.taken_at:%Y-%m-%d %H:%M}'
+
+
+class SnapshotEntry(models.Model):
+    # Plain ids rather than foreign keys: a snapshot must outlive the rows it describes.
+    snapshot = models.ForeignKey(StateSnapshot, on_delete=models.CASCADE, related_name='entries')
+    equipment_id = models.UUIDField()
+    status = models.CharField(max_length=32, choices=Equipment.Status.choices)
+    location_id = models.BigIntegerField(null=True)
+    responsible_user_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot', 'equipment_id'], name='snapshotentry_unique_item'),
+        ]
+        indexes = [
+            models.Index(fields=['snapshot', 'location_id'], name='snapshotentry_location_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.equipment_id} @ {self.snapshot_id}'
@@ -0,0 +1,6 @@
+from rest_framework import serializers
+
+
+class StateAsOfSerializer(serializers.Serializer):
+    at = serializers.DateTimeField()
+    location = serializers.IntegerField(required=False)
@@ -1,3 +1,106 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from equipment.models import Equipment, EquipmentCategory, Location
+from operations.models import Operation
+from reports import history
+from reports.models import StateSnapshot
+
+User = get_user_model()
+
+
+class StateAsOfTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.worker = User.objects.create_user(username='worker', password='pass', role='worker')
+        self.client.force_authenticate(self.admin)
+        self.now = timezone.now()
+        self.warehouse = Location.objects.create(name='Склад')
+        self.shelf = Location.objects.create(name='Стеллаж', parent=self.warehouse)
+        self.workshop = Location.objects.create(name='Мастерская')
+        self.equipment = Equipment.objects.create(
+            name='Дрель',
+            category=EquipmentCategory.objects.create(name='Инструмент'),
+            location=self.shelf,
+        )
+        Equipment.objects.filter(pk=self.equipment.pk).update(created_at=self.ago(10))
+
+    def ago(self, days):
+        return self.now - timedelta(days=days)
+
+    def record(self, days, action_type, **fields):
+        operation = Operation.objects.create(
+            equipment=self.equipment, action_type=action_type, user=self.admin, **fields,
+        )
+        Operation.objects.filter(pk=operation.pk).update(timestamp=self.ago(days))
+
+    def as_of(self, days, **params):
+        response = self.client.get(reverse('reports-as-of'), {'at': self.ago(days).isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_replays_operations_after_nearest_snapshot(self):
+        snapshot = history.take_snapshot()
+        self.assertEqual(snapshot.item_count, 1)
+        StateSnapshot.objects.filter(pk=snapshot.pk).update(taken_at=self.ago(5))
+        # Stamped before the snapshot but committed after its copy: the replay overlap still applies it.
+        self.record(5 + 1 / 1440, Operation.ActionType.ISSUE, target_user=self.worker)
+        self.record(2, Operation.ActionType.RETURN, condition=Operation.Condition.NEED_REPAIR)
+        self.record(1, Operation.ActionType.MOVE, location_from=self.shelf, location_to=self.workshop)
+
+        data = self.as_of(3)
+        self.assertEqual(data['replayed_operations'], 1)
+        self.assertIsNotNone(data['snapshot_taken_at'])
+        [item] = data['items']
+        self.assertEqual(item['status'], Equipment.Status.ISSUED)
+        self.assertEqual(item['responsible_user_id'], self.worker.id)
+
+        # Older operations may be archived, so moments before the first snapshot are refused.
+        response = self.client.get(reverse('reports-as-of'), {'at': self.ago(6).isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(len(self.as_of(3, location=self.warehouse.id)['items']), 1)
+        self.assertEqual(self.as_of(3, location=self.workshop.id)['items'], [])
+        [item] = self.as_of(0, location=self.workshop.id)['items']
+        self.assertEqual(item['status'], Equipment.Status.IN_REPAIR)
+        self.assertIsNone(item['responsible_user_id'])
+
+    def test_prune_keeps_first_snapshot_of_each_month(self):
+        first = StateSnapshot.objects.create(taken_at=timezone.now().replace(year=2024, month=3, day=1))
+        StateSnapshot.objects.create(taken_at=first.taken_at + timedelta(days=7))
+        recent = history.take_snapshot()
+        self.assertEqual(history.prune_snapshots(keep_days=30), 1)
+        self.assertQuerySetEqual(StateSnapshot.objects.order_by('taken_at'), [first, recent])
+
+
+class ReportExportTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pass', role='admin')
+        self.client.force_authenticate(self.admin)
+        equipment = Equipment.objects.create(name='Дрель')
+        for action_type in (Operation.ActionType.MOVE, Operation.ActionType.REPAIR):
+            Operation.objects.create(equipment=equipment, action_type=action_type, user=self.admin, notes='a,b')
+
+    # The page at /reports/ shares the 'reports' URL name, so the API path is spelled out.
+    url = '/api/reports/'
+
+    def test_csv_and_ndjson_are_streamed(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('ID,ID оборудования'))
+        self.assertTrue(lines[1].endswith(',"a,b"'))
+
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['Тип операции'] for row in rows], ['Перемещение', 'Ремонт'])
+
+        self.assertEqual(self.client.get(self.url, {'format': 'csv', 'start': 'yesterday'}).status_code, 400)
@@ -1,15 +1,21 @@
 import csv
 import io
+import json
 
+from django.db import transaction
 from django.db.models import Count
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from openpyxl import Workbook
 
+from equipment.models import Equipment, Location
 from operations.models import Operation
+from operations.serializers import OperationFilterSerializer
 from users.permissions import IsStorekeeperOrAdmin
+from .history import state_as_of
+from .serializers import StateAsOfSerializer
 
 
 class StatsView(APIView):
@@ -25,49 +31,74 @@ class StatsView(APIView):
         return Response(data)
 
 
+REPORT_FIELDS = (
+    'id', 'equipment_id', 'equipment__name', 'action_type', 'user__username', 'target_user__username',
+    'timestamp', 'notes',
+)
+REPORT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like sink for ``csv.writer`` that hands each formatted line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
 class ReportView(APIView):
     permission_classes = [IsStorekeeperOrAdmin]
 
+    def get_queryset(self):
+        params = OperationFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = Operation.objects.order_by('timestamp', 'id')
+        if 'start' in params.validated_data:
+            queryset = queryset.filter(timestamp__gte=params.validated_data['start'])
+        if 'end' in params.validated_data:
+            queryset = queryset.filter(timestamp__lte=params.validated_data['end'])
+        return queryset
+
+    @staticmethod
+    def report_rows(queryset):
+        """Yield report rows read through a server-side cursor, so memory stays flat however long the range.
+
+        The cursor is opened inside a transaction: in autocommit PostgreSQL declares it WITH HOLD,
+        which materializes the whole result before the first row is fetched.
+        """
+        action_labels = dict(Operation.ActionType.choices)
+        with transaction.atomic():
+            for op in queryset.values(*REPORT_FIELDS).iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield {
+                    'ID': op['id'],
+                    'ID оборудования': str(op['equipment_id']),
+                    'Наименование оборудования': op['equipment__name'],
+                    'Тип операции': action_labels.get(op['action_type'], op['action_type']),
+                    'Пользователь': op['user__username'],
+                    'Получатель': op['target_user__username'] or '',
+                    'Дата и время': op['timestamp'].isoformat(),
+                    'Комментарий': op['notes'],
+                }
+
     def get(self, request):
-        start = request.query_params.get('start')
-        end = request.query_params.get('end')
-        qs = Operation.objects.select_related('equipment', 'user', 'target_user').all()
-        if start:
-            qs = qs.filter(timestamp__gte=start)
-        if end:
-            qs = qs.filter(timestamp__lte=end)
-        rows = []
-        for op in qs:
-            action_label = op.get_action_type_display()
-            rows.append({
-                'ID': op.id,
-                'ID оборудования': str(op.equipment_id),
-                'Наименование оборудования': op.equipment.name,
-                'Тип операции': action_label,
-                'Пользователь': op.user.username,
-                'Получатель': op.target_user.username if op.target_user else '',
-                'Дата и время': op.timestamp.isoformat(),
-                'Комментарий': op.notes,
-            })
+        # Filters are validated here, before streaming starts, so bad input still gets a 400.
+        rows = self.report_rows(self.get_queryset())
         export_format = request.query_params.get('format')
         if export_format == 'csv':
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=rows[0].keys() if rows else [])
-            if rows:
-                writer.writeheader()
-                writer.writerows(rows)
-            csv_text = '\ufeff' + output.getvalue()
-            response = HttpResponse(csv_text, content_type='text/csv; charset=utf-8')
+            response = StreamingHttpResponse(self.stream_csv(rows), content_type='text/csv; charset=utf-8')
             response['Content-Disposition'] = 'attachment; filename="report.csv"'
             return response
+        if export_format == 'ndjson':
+            lines = (json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+            response = StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="report.ndjson"'
+            return response
         if export_format == 'xlsx':
-            workbook = Workbook()
-            sheet = workbook.active
-            sheet.title = 'Report'
-            if rows:
-                sheet.append(list(rows[0].keys()))
-                for row in rows:
-                    sheet.append(list(row.values()))
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet('Report')
+            for index, row in enumerate(rows):
+                if index == 0:
+                    sheet.append(list(row.keys()))
+                sheet.append(list(row.values()))
             output = io.BytesIO()
             workbook.save(output)
             output.seek(0)
@@ -77,4 +108,47 @@ class ReportView(APIView):
             )
             response['Content-Disposition'] = 'attachment; filename="report.xlsx"'
             return response
-        return Response(rows)
+        return Response(list(rows))
+
+    @staticmethod
+    def stream_csv(rows):
+        writer = csv.writer(_Echo())
+        header = True
+        yield '\ufeff'
+        for row in rows:
+            if header:
+                yield writer.writerow(row.keys())
+                header = False
+            yield writer.writerow(row.values())
+
+
+class StateAsOfView(APIView):
+    """Equipment status, location and holder as they were at ``?at=``, optionally within ``?location=``'s subtree."""
+
+    permission_classes = [IsStorekeeperOrAdmin]
+
+    def get(self, request):
+        params = StateAsOfSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        moment = params.validated_data['at']
+        location_ids = None
+        if 'location' in params.validated_data:
+            location = Location.objects.filter(pk=params.validated_data['location']).first()
+            if location is None:
+                return Response({'detail': 'Location not found'}, status=404)
+            location_ids = list(
+                Location.objects.filter(path__startswith=location.path).values_list('id', flat=True)
+            )
+        snapshot, replayed, states = state_as_of(moment, location_ids)
+        names = dict(Equipment.objects.filter(id__in=list(states)).values_list('id', 'name'))
+        items = [
+            {'equipment_id': str(equipment_id), 'name': names.get(equipment_id, ''), **state}
+            for equipment_id, state in states.items()
+        ]
+        items.sort(key=lambda item: item['name'])
+        return Response({
+            'at': moment,
+            'snapshot_taken_at': snapshot.taken_at,
+            'replayed_operations': replayed,
+            'items': items,
+        })
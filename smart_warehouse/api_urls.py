@@ -4,8 +4,8 @@ from rest_framework.routers import DefaultRouter
 from equipment.views import EquipmentCategoryViewSet, EquipmentViewSet, LocationViewSet
 from inventory.views import InventorySessionViewSet
 from notifications.views import NotificationViewSet, OverdueView
-from operations.views import IssueView, OperationViewSet, ReturnView, ScanView
-from reports.views import ReportView, StatsView
+from operations.views import IssueBatchView, IssueView, OperationViewSet, ReturnBatchView, ReturnView, ScanBatchView, ScanView
+from reports.views import ReportView, StateAsOfView, StatsView
 from users.views import UserViewSet
 
 router = DefaultRouter()
@@ -17,12 +17,17 @@ router.register('operations', OperationViewSet, basename='operations')
 router.register('inventory', InventorySessionViewSet, basename='inventory')
 router.register('notifications', NotificationViewSet, basename='notifications')
 
+# Explicit routes come before the router, whose operations/<pk>/ pattern would otherwise match them.
 urlpatterns = [
-    path('', include(router.urls)),
     path('scan/', ScanView.as_view(), name='scan'),
+    path('scan/batch/', ScanBatchView.as_view(), name='scan-batch'),
     path('operations/issue/', IssueView.as_view(), name='operations-issue'),
+    path('operations/issue/batch/', IssueBatchView.as_view(), name='operations-issue-batch'),
     path('operations/return/', ReturnView.as_view(), name='operations-return'),
+    path('operations/return/batch/', ReturnBatchView.as_view(), name='operations-return-batch'),
     path('reports/', ReportView.as_view(), name='reports'),
+    path('reports/as-of/', StateAsOfView.as_view(), name='reports-as-of'),
     path('stats/', StatsView.as_view(), name='stats'),
     path('notifications/overdue/', OverdueView.as_view(), name='notifications-overdue'),
+    path('', include(router.urls)),
 ]
@@ -0,0 +1,100 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Func, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """Opaque-cursor pagination: each page is an index range scan, however deep the client scrolls.
+
+    DRF positions a cursor on the first ordering field alone and steps through ties with an
+    OFFSET, capped at ``offset_cutoff``. Here the cursor holds every ordering field, the last of
+    which must be unique, and a page starts after it with one row comparison such as
+    ``(updated_at, id) < (%s, %s)``, so rows sharing a timestamp cost nothing extra.
+    """
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor.position if self.cursor is not None else None
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, current_position))
+
+        # One extra row tells whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, model, ordering, position):
+        """Filter for rows strictly past ``position`` (one value per ordering field) in ``ordering``."""
+        descending = {name.startswith('-') for name in ordering}
+        assert len(descending) == 1, 'Keyset pagination needs every ordering field in the same direction.'
+        fields = [model._meta.get_field(name.lstrip('-')) for name in ordering]
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError(position)
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        columns = Func(*(F(field.attname) for field in fields), function='ROW', output_field=fields[0])
+        bounds = Func(*(Value(value, output_field=field) for field, value in zip(fields, values)),
+                      function='ROW', output_field=fields[0])
+        lookup = LessThan if descending.pop() else GreaterThan
+        return lookup(columns, bounds)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for name in ordering:
+            name = name.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values, separators=(',', ':'))
+
+
+class EquipmentCursorPagination(KeysetPagination):
+    ordering = ('-updated_at', '-id')
+
+
+class OperationCursorPagination(KeysetPagination):
+    ordering = ('-timestamp', '-id')
+
+
+class DiscrepancyCursorPagination(KeysetPagination):
+    ordering = ('id',)
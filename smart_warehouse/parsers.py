@@ -0,0 +1,37 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON: one value per line, parsed into a list. Blank lines are skipped.
+
+    Parsing stops with a 400 once the body passes ``DATA_UPLOAD_MAX_MEMORY_SIZE`` bytes or the view's
+    ``ndjson_max_items`` values, so an oversized upload is never read whole.
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        max_items = getattr(parser_context.get('view'), 'ndjson_max_items', None)
+        max_bytes = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        values = []
+        size = 0
+        for number, line in enumerate(stream, start=1):
+            size += len(line)
+            if max_bytes is not None and size > max_bytes:
+                raise ParseError(f'NDJSON body is larger than {max_bytes} bytes')
+            line = line.strip()
+            if not line:
+                continue
+            if max_items is not None and len(values) >= max_items:
+                raise ParseError(f'At most {max_items} NDJSON lines are accepted')
+            try:
+                values.append(json.loads(line.decode(encoding)))
+            except (UnicodeDecodeError, ValueError) as exc:
+                raise ParseError(f'NDJSON parse error on line {number}: {exc}')
+        return values
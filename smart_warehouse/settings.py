@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'users',
@@ -134,9 +135,34 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Widths of the resized copies built by `manage.py process_photo_variants`.
+PHOTO_VARIANT_WIDTHS = (64, 256, 1024)
 
 AUTH_USER_MODEL = 'users.User'
 
+# `manage.py operation_partitions --archive` moves older months of history here.
+OPERATION_RETENTION_MONTHS = 24
+OPERATION_ARCHIVE_DIR = BASE_DIR / 'archive' / 'operations'
+
+# Point 'default' at a shared backend (Redis, Memcached) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Scan lookups: a per-process LRU of SCAN_CACHE_LOCAL_SIZE items kept for SCAN_CACHE_LOCAL_TTL
+# seconds in front of the SCAN_CACHE_ALIAS cache.
+SCAN_CACHE_ALIAS = 'default'
+SCAN_CACHE_TIMEOUT = 300
+SCAN_CACHE_LOCAL_SIZE = 4096
+SCAN_CACHE_LOCAL_TTL = 5
+
+QR_CACHE_DIR = BASE_DIR / 'cache' / 'qr'
+QR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+QR_RENDER_WORKERS = 4
+QR_LABEL_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -145,6 +171,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # ?format= selects export formats in views (reports, QR images), not DRF renderers.
+    'URL_FORMAT_OVERRIDE': None,
 }
 
 LOGGING = {
@@ -2,6 +2,7 @@ const state = {
   token: localStorage.getItem('access_token') || '',
   refreshToken: localStorage.getItem('refresh_token') || '',
   inventorySessionId: null,
+  equipmentNext: null,
   role: null,
 };
 const publicPaths = new Set(['/login/', '/403/', '/404/', '/500/', '/501/', '/503/']);
@@ -245,12 +246,20 @@ async function refreshAccessToken() {
 }
 
 async function loadEquipment() {
+  const tbody = getEl('equipment-list');
+  if (!tbody) return;
+  tbody.innerHTML = '';
+  state.equipmentNext = '/api/equipment/';
+  await loadMoreEquipment();
+}
+
+async function loadMoreEquipment() {
+  const tbody = getEl('equipment-list');
+  if (!tbody || !state.equipmentNext) return;
   try {
-    const data = await apiRequest('/api/equipment/');
-    const tbody = getEl('equipment-list');
-    if (!tbody) return;
-    tbody.innerHTML = '';
-    data.forEach((item) => {
+    const data = await apiRequest(state.equipmentNext);
+    state.equipmentNext = data.next;
+    data.results.forEach((item) => {
       const row = document.createElement('tr');
       const statusLabel = mapLabel(labelMap.status, item.status);
       row.innerHTML = `
@@ -261,6 +270,8 @@ async function loadEquipment() {
       `;
       tbody.appendChild(row);
     });
+    const moreBtn = getEl('load-more-equipment');
+    if (moreBtn) moreBtn.classList.toggle('d-none', !data.next);
   } catch (error) {
     setStatus('Нет доступа к списку оборудования');
   }
@@ -347,6 +358,7 @@ async function startInventory(event) {
       body: JSON.stringify(payload),
     });
     state.inventorySessionId = response.id;
+    inventoryQueue.length = 0;
     const resultEl = getEl('inventory-result');
     if (resultEl) {
       resultEl.textContent = `Сессия ${response.id} запущена`;
@@ -357,22 +369,51 @@ async function startInventory(event) {
   }
 }
 
-async function scanInventory() {
+// Reads are queued and sent together, so rapid scanning costs one request per burst.
+const inventoryBatchSize = 200;
+const inventoryFlushDelay = 500;
+const inventoryQueue = [];
+let inventoryFlushTimer = null;
+// Batches are sent one after another; this settles once every flush requested so far has landed.
+let inventoryFlushing = Promise.resolve();
+
+function scanInventory() {
   const scanInput = getEl('inventory-scan-id');
   if (!scanInput) return;
   const equipmentId = scanInput.value.trim();
   if (!state.inventorySessionId || !equipmentId) return;
+  inventoryQueue.push(equipmentId);
+  if (inventoryQueue.length >= inventoryBatchSize) {
+    flushInventoryScans();
+  } else if (!inventoryFlushTimer) {
+    inventoryFlushTimer = setTimeout(flushInventoryScans, inventoryFlushDelay);
+  }
+}
+
+function flushInventoryScans() {
+  clearTimeout(inventoryFlushTimer);
+  inventoryFlushTimer = null;
+  inventoryFlushing = inventoryFlushing.then(sendInventoryBatch);
+  return inventoryFlushing;
+}
+
+async function sendInventoryBatch() {
+  if (!state.inventorySessionId || !inventoryQueue.length) return;
+  const batch = inventoryQueue.splice(0, inventoryQueue.length);
   try {
-    const response = await apiRequest(`/api/inventory/${state.inventorySessionId}/scan/`, {
+    const response = await apiRequest(`/api/inventory/${state.inventorySessionId}/scan/batch/`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ equipment_id: equipmentId }),
+      body: JSON.stringify(batch),
     });
     const resultEl = getEl('inventory-result');
     if (resultEl) {
-      resultEl.textContent = `Отсканировано: ${response.scanned_count}`;
+      const unknown = response.unknown + response.malformed;
+      resultEl.textContent = `Отсканировано: ${response.scanned_count}` + (unknown ? `, не найдено: ${unknown}` : '');
     }
   } catch (error) {
+    // Keep the reads for the next attempt, e.g. once the handheld is back online.
+    inventoryQueue.unshift(...batch);
     const resultEl = getEl('inventory-result');
     if (resultEl) resultEl.textContent = 'Ошибка сканирования';
   }
@@ -380,6 +421,8 @@ async function scanInventory() {
 
 async function finishInventory() {
   if (!state.inventorySessionId) return;
+  await flushInventoryScans();
+  if (inventoryQueue.length) return;
   try {
     const response = await apiRequest(`/api/inventory/${state.inventorySessionId}/finish/`, {
       method: 'POST',
@@ -387,7 +430,7 @@ async function finishInventory() {
     const resultEl = getEl('inventory-result');
     if (resultEl) {
       resultEl.textContent =
-        `Завершено. Отсутствует: ${response.missing.length}, лишнее: ${response.extra.length}`;
+        `Завершено. Отсутствует: ${response.missing_count}, лишнее: ${response.extra_count}`;
     }
     state.inventorySessionId = null;
   } catch (error) {
@@ -600,6 +643,8 @@ document.querySelectorAll('form[data-login-form]').forEach((form) => {
 });
 const refreshBtn = getEl('refresh-equipment');
 if (refreshBtn) refreshBtn.addEventListener('click', loadEquipment);
+const moreEquipmentBtn = getEl('load-more-equipment');
+if (moreEquipmentBtn) moreEquipmentBtn.addEventListener('click', loadMoreEquipment);
 const scanBtn = getEl('scan-button');
 if (scanBtn) {
   scanBtn.addEventListener('click', () => {
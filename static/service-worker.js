@@ -1,10 +1,10 @@
-const CACHE_NAME = 'smart-warehouse-v19';
+const CACHE_NAME = 'smart-warehouse-v24';
 const STATIC_ASSETS = [
   '/',
   '/static/styles.css?v=18',
   '/static/rt-theme.css?v=18',
   '/static/rt-purple-theme.css?v=18',
-  '/static/app.js?v=18',
+  '/static/app.js?v=22',
   '/static/manifest.json',
   '/static/icon.svg',
 ];
@@ -25,6 +25,8 @@ self.addEventListener('activate', (event) => {
 
 self.addEventListener('fetch', (event) => {
   if (event.request.method !== 'GET') return;
+  // API responses are revalidated with ETags through the HTTP cache; never serve them from here.
+  if (new URL(event.request.url).pathname.startsWith('/api/')) return;
   event.respondWith(
     caches.match(event.request).then((cached) => {
       if (cached) return cached;